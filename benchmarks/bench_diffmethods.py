@@ -0,0 +1,93 @@
+import importlib
+from genebench.diffmethods.ttest import TTest
+from genebench.diffmethods.limmapy import LimmaPy
+from genebench.diffmethods.sampy import SAMPy
+from genebench.diffmethods.chdirpy import ChDirPy
+from genebench.diffmethods.random import Random
+from genebench.diffmethods.MIDGET.common import MIDGET
+from benchmarks.common import NUM_GENES, NUM_REPLICATES
+from benchmarks.common import make_validation, make_geo, make_input
+
+
+class DiffMethodsSuite:
+    # DiffMethod.run of the python methods on one experiment
+    params = (NUM_GENES, NUM_REPLICATES)
+    param_names = ['num_genes', 'num_replicates']
+    timeout = 600
+
+    def setup(self, num_genes, num_replicates):
+        validation = make_validation(num_genes)
+        geo = make_geo(validation, num_genes, num_replicates)
+        self.input = make_input(geo, num_replicates)
+        self.ttest = TTest()
+        self.ttest.setup({})
+        self.limmapy = LimmaPy()
+        self.limmapy.setup({})
+        self.sampy = SAMPy()
+        self.sampy.setup({})
+        self.sampy_permutations = SAMPy()
+        self.sampy_permutations.setup({'delta': 0.5, 'seed': 1})
+        self.chdirpy = ChDirPy()
+        self.chdirpy.setup({})
+        self.random = Random()
+        self.random.setup({})
+        # only the feature extraction, the trained models are not shipped
+        self.midget = MIDGET()
+
+    def time_ttest(self, num_genes, num_replicates):
+        self.ttest.run(self.input)
+
+    def time_limmapy(self, num_genes, num_replicates):
+        self.limmapy.run(self.input)
+
+    def time_sampy(self, num_genes, num_replicates):
+        self.sampy.run(self.input)
+
+    def time_sampy_permutations(self, num_genes, num_replicates):
+        self.sampy_permutations.run(self.input)
+
+    def time_chdirpy(self, num_genes, num_replicates):
+        self.chdirpy.run(self.input)
+
+    def time_random(self, num_genes, num_replicates):
+        self.random.run(self.input)
+
+    def time_midget_features(self, num_genes, num_replicates):
+        self.midget.do_run_feature_vectors(self.input.control,
+                                           self.input.perturbed,
+                                           self.input.genes)
+
+
+class RDiffMethodsSuite:
+    # R methods, skipped when rpy2 or the R packages are missing
+    params = (NUM_GENES, NUM_REPLICATES)
+    param_names = ['num_genes', 'num_replicates']
+    timeout = 1800
+    methods = {'limma': ('genebench.diffmethods.limma', 'LIMMA'),
+               'sam': ('genebench.diffmethods.sam', 'SAM'),
+               'chdir': ('genebench.diffmethods.chdir', 'ChDir')}
+
+    def setup(self, num_genes, num_replicates):
+        validation = make_validation(num_genes)
+        geo = make_geo(validation, num_genes, num_replicates)
+        self.input = make_input(geo, num_replicates)
+        self.instances = {}
+        try:
+            for name, (module_name, class_name) in self.methods.items():
+                module = importlib.import_module(module_name)
+                instance = getattr(module, class_name)()
+                instance.setup({})
+                self.instances[name] = instance
+            # a first run sources the scripts and loads the R packages
+            self.instances['limma'].run(self.input)
+        except Exception as ex:
+            raise NotImplementedError(f"R methods not available: {ex}")
+
+    def time_limma(self, num_genes, num_replicates):
+        self.instances['limma'].run(self.input)
+
+    def time_sam(self, num_genes, num_replicates):
+        self.instances['sam'].run(self.input)
+
+    def time_chdir(self, num_genes, num_replicates):
+        self.instances['chdir'].run(self.input)
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+from genebench.diffmethods.random import Random
+from genebench.evaluationmetrics.f1 import F1
+from genebench.evaluationmetrics.roc import ROC
+from genebench.evaluationmetrics.kolmogorov import Kolmogorov
+from benchmarks.common import NUM_GENES
+from benchmarks.common import make_validation, make_geo, make_input
+
+NUM_REPLICATES = 3
+NUM_EXPERIMENTS = 20
+METRICS = {'F1': F1, 'ROC': ROC, 'Kolmogorov': Kolmogorov}
+
+
+class MetricsSuiteBase:
+    params = (list(METRICS.keys()), NUM_GENES)
+    param_names = ['metric', 'num_genes']
+    timeout = 600
+
+    def setup(self, metric_name, num_genes):
+        self.folder = tempfile.mkdtemp(prefix="genebench_asv_")
+        self.metric = METRICS[metric_name]({'name': metric_name,
+                                            'module_name': "",
+                                            'class_name': metric_name,
+                                            'params': {}},
+                                           self.folder)
+        self.validation = make_validation(num_genes)
+        method = Random()
+        self.results = []
+        for id in range(NUM_EXPERIMENTS):
+            geo = make_geo(self.validation, num_genes, NUM_REPLICATES, id)
+            result = method.run(make_input(geo, NUM_REPLICATES))
+            self.results.append((geo.pf, result))
+
+    def teardown(self, metric_name, num_genes):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def add_all(self):
+        for pf, result in self.results:
+            self.metric.add(pf, "Random", self.validation, result)
+
+
+class MetricsAddSuite(MetricsSuiteBase):
+    # Metric.add of the results of one method on every experiment
+    def time_add(self, metric_name, num_genes):
+        self.add_all()
+
+
+class MetricsEvaluateSuite(MetricsSuiteBase):
+    # evaluate consumes the added results, so every sample gets a fresh
+    # setup
+    number = 1
+    repeat = 5
+
+    def setup(self, metric_name, num_genes):
+        super().setup(metric_name, num_genes)
+        self.add_all()
+
+    def time_evaluate(self, metric_name, num_genes):
+        self.metric.evaluate("asv", plots=False)
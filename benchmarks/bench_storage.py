@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+from genebench.diffmethods.random import Random
+from genebench.storage.storage import Storage
+from genebench.storage.storageprovidermongo import StorageProviderMongo
+from benchmarks.common import NUM_GENES
+from benchmarks.common import make_validation, make_geo, make_input
+from benchmarks.common import write_config
+
+NUM_REPLICATES = 6
+MONGO_CONFIG = {"user": "", "password": "", "host": "localhost",
+                "port": 27017, "database_name": "genebench_asv",
+                "validation_collection_name": "validation",
+                "geo_data_collection_name": "geo",
+                "results_collection_name": "results", "anon": True}
+
+
+def make_storage(provider_name, folder):
+    # storage with a single provider and no cache, so every call reaches
+    # the provider, mongo runs on mongomock to stay offline
+    providers = {}
+    created_providers = {}
+    if provider_name == 'mongo':
+        try:
+            import mongomock
+            import mongomock.gridfs
+        except ImportError:
+            raise NotImplementedError("mongomock is not installed")
+        mongomock.gridfs.enable_gridfs_integration()
+        created_providers['mongo'] = StorageProviderMongo(
+            MONGO_CONFIG, client=mongomock.MongoClient())
+    else:
+        providers[provider_name] = {"base_path": folder,
+                                    "validation_folder": "validation",
+                                    "geo_folder": "geo",
+                                    "results_folder": "results"}
+    config_filename = write_config(folder, {"Storage": {
+        "providers": providers,
+        "load_order": [provider_name],
+        "cache": {"max_bytes": 0}}})
+    return Storage(config_filename, providers=created_providers)
+
+
+class StorageSuite:
+    # insert and load round trips of one experiment and one method result
+    params = (['filesystem', 'binary', 'mongo'], NUM_GENES)
+    param_names = ['provider', 'num_genes']
+    timeout = 600
+
+    def setup(self, provider_name, num_genes):
+        self.folder = tempfile.mkdtemp(prefix="genebench_asv_")
+        self.storage = make_storage(provider_name, self.folder)
+        validation = make_validation(num_genes)
+        self.geo = make_geo(validation, num_genes, NUM_REPLICATES)
+        method = Random()
+        self.result = method.run(make_input(self.geo, NUM_REPLICATES))
+        self.storage.insert_geo(self.geo)
+        self.storage.insert_method_results(self.result, "Random",
+                                           self.geo.name)
+
+    def teardown(self, provider_name, num_genes):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def time_insert_geo(self, provider_name, num_genes):
+        self.storage.insert_geo(self.geo)
+
+    def time_get_geo(self, provider_name, num_genes):
+        self.storage.get_geo({'source': self.geo.source,
+                              'name': self.geo.name})
+
+    def time_insert_method_results(self, provider_name, num_genes):
+        self.storage.insert_method_results(self.result, "Random",
+                                           self.geo.name)
+
+    def time_get_method_results(self, provider_name, num_genes):
+        self.storage.get_method_results({'method_name': "Random",
+                                         'experiment_name': self.geo.name})
@@ -0,0 +1,52 @@
+import os
+import json
+import random
+import numpy as np
+from genebench.datatypes import GeneDiffInput, GeneDiffValidation
+from genebench.silico.generators.linear import LinearDataGenerator
+from genebench.utils import Utils
+
+# sizes of the synthetic experiments: genes x replicates per condition
+NUM_GENES = [1000, 10000, 30000]
+NUM_REPLICATES = [3, 6, 12]
+NUM_PFS = 10
+
+
+def make_validation(num_genes, num_pfs=NUM_PFS, seed=0):
+    # same layout as SilicoGeneratorsManager.generate_validation_data,
+    # seeded so every run times the same data
+    rng = random.Random(seed)
+    gene_names = Utils.get_random_gene_names(num_genes)
+    data = {}
+    for pf in Utils.get_random_tf_names(num_pfs):
+        num = rng.randint(2, len(gene_names))
+        data[pf] = list(set(rng.choices(gene_names, k=num)))
+    validation = GeneDiffValidation()
+    validation.source = "silico"
+    validation.data = data
+    return validation
+
+
+def make_geo(validation, num_genes, num_replicates, id=0):
+    random.seed(id)
+    np.random.seed(id)
+    generator = LinearDataGenerator({
+        "name": "silico.linear",
+        "source": "silico_linear",
+        "module_name": "genebench.silico.generators.linear",
+        "class_name": "LinearDataGenerator",
+        "params": {"diff_factor": 3.0,
+                   "noise_factor": 0.5,
+                   "num_replicates": num_replicates}})
+    return generator.generate_single(validation, id, num_genes)
+
+
+def make_input(geo, num_replicates):
+    return GeneDiffInput.from_geo_data(geo, max_replicates=num_replicates)
+
+
+def write_config(folder, sections):
+    config_filename = os.path.join(folder, "config.json")
+    with open(config_filename, "w") as out:
+        json.dump(sections, out)
+    return config_filename
@@ -1,7 +1,20 @@
+import argparse
 from genebench.benchmark import BenchmarkDiffMethods
 
-benchmark = BenchmarkDiffMethods("config.json")
-# run all methods and store results
-benchmark.generate_method_results()
-# generate the actual metrics and plots for comparison
-benchmark.generate_comparisons()
\ No newline at end of file
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="only write the metric scores, skip the plots")
+    args = parser.parse_args()
+    plots = False if args.no_plots else None
+    benchmark = BenchmarkDiffMethods(args.config, plots=plots)
+    # run all methods and store results
+    benchmark.generate_method_results()
+    # generate the actual metrics and plots for comparison
+    benchmark.generate_comparisons()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,8 +21,8 @@ def generate_all_feature_vectors(out_file_name):
                                 valid_sources))
     logger.info(f"we now have {len(valid_sources)} validation sources")
     validation_cache = {}
-    logger.info("getting all geos")
-    geos = storage.get_geo({})
+    logger.info("getting all geos meta data")
+    geos = list(storage.iter_geo({}, meta_only=True))
     logger.info(f"we have total {len(geos)}")
     logger.info("filtering geos")
     #geos = list(filter(lambda x: 'silico' not in x.source, geos))
@@ -50,7 +50,8 @@ def generate_all_feature_vectors(out_file_name):
     all_data = []
     midget_instance = MIDGETNeural()
     running_sum = 0
-    for idx, geo in enumerate(geos):
+    # stream the experiments so only one expression matrix is in memory
+    for idx, geo in enumerate(storage.iter_geo({})):
         pf = geo.pf.lower()
         if pf not in validation_cache:
             logger.error(f"could not find {pf} in validation set, skipping")
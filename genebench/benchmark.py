@@ -1,6 +1,16 @@
-from genebench.datatypes import GeneDiffInput, GeneData
+import time
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED, ALL_COMPLETED
+from genebench.datatypes import GeneDiffInput
 from genebench.utils import Utils
 from genebench.diffmethods.diffmethodsmanager import DiffMethodsManager
+from genebench.methodexecutor import SerialMethodExecutor
+from genebench.methodexecutor import ProcessMethodExecutor
+from genebench.methodexecutor import SupervisedMethodExecutor
+from genebench.methodexecutor import MethodTaskFailure
+from genebench.runmanifest import RunManifest
+from genebench.profiler import Profiler, ProfilerConfig
+from genebench.orchestrator import MethodResultsOrchestrator, PipelineConfig
 from genebench.storage.storage import Storage
 from genebench.evaluationmetrics.metricmanager import MetricManager
 
@@ -22,7 +32,27 @@ class BenchmarkRunConfig:
 
 
 class BenchamarkDiffMethodsConfig:
-    def __init__(self, logger, method_groups, runs):
+    def __init__(self, logger, method_groups, runs, workers=0,
+                 max_pending_tasks=None, manifest=None, task_timeout=None,
+                 task_max_memory_mb=None, retry_failed_tasks=False,
+                 profile=None, batch_size=1, pipeline=None):
+        # workers > 0 runs the methods in that many spawned processes,
+        # at most max_pending_tasks batches are queued for them
+        self.workers = workers
+        # number of experiments given to a method in one run_batch call
+        self.batch_size = max(batch_size, 1)
+        # overlaps the storage reads and writes with the methods
+        self.pipeline = PipelineConfig(pipeline)
+        # path of the run manifest, a run with a manifest can be resumed
+        self.manifest = manifest
+        # with a timeout (seconds) or a memory limit every method run is
+        # supervised, failed runs are recorded and skipped on resume
+        self.task_timeout = task_timeout
+        self.task_max_memory_mb = task_max_memory_mb
+        self.retry_failed_tasks = retry_failed_tasks
+        # per stage timings, written next to the metrics output
+        self.profile = profile or {}
+        self.max_pending_tasks = max_pending_tasks or 2 * max(workers, 1)
         self.method_groups = {}
         for name, method_group in method_groups.items():
             self.method_groups[name] = BenchmarkMethodGroupConfig(
@@ -39,16 +69,31 @@ class BenchamarkDiffMethodsConfig:
 
 class BenchmarkDiffMethods:
 
-    def __init__(self, config_filename):
+    def __init__(self, config_filename, plots=None):
         self.logger = Utils.get_logger("Benchmark")
+        self.config_filename = config_filename
         self.config = Utils.get_config(config_filename, "Benchmark")
         self.config = BenchamarkDiffMethodsConfig(logger=self.logger,
                                                   **self.config)
         self.method_manager = DiffMethodsManager(config_filename)
-        self.method_manager.setup()
+        if self.config.workers <= 0:
+            self.method_manager.setup()
         self.storage = Storage(config_filename)
         self.metric_manager = MetricManager(config_filename)
+        if plots is not None:
+            # overrides the "plots" field of AccuracyMetrics
+            self.metric_manager.config.plots = plots
         self.metric_manager.setup()
+        self.manifest = None
+        if self.config.manifest:
+            self.manifest = RunManifest(self.config.manifest)
+        self.unsaved_tasks = []
+        self.tasks_lock = threading.Lock()
+        self.failed_tasks = []
+        self.batches = {}
+        profiler_config = ProfilerConfig(
+            self.config.profile, self.metric_manager.config.output_folder)
+        self.profiler = Profiler(profiler_config)
 
     def run_method(method_name: str, input: GeneDiffInput):
         pass
@@ -69,73 +114,330 @@ class BenchmarkDiffMethods:
                     execution_map[method_name] = entry.union(new_sources)
         return execution_map
 
+    def create_executor(self):
+        if self.config.task_timeout or self.config.task_max_memory_mb:
+            max_memory = None
+            if self.config.task_max_memory_mb:
+                max_memory = self.config.task_max_memory_mb * 1024 * 1024
+            self.logger.info(f"starting {max(self.config.workers, 1)} "
+                             f"supervised method workers")
+            executor = SupervisedMethodExecutor(self.config_filename,
+                                                self.config.workers,
+                                                self.config.task_timeout,
+                                                max_memory)
+            self.method_manager.method_digests.update(
+                executor.get_method_digests())
+            return executor
+        if self.config.workers <= 0:
+            return SerialMethodExecutor(self.method_manager)
+        self.logger.info(f"starting {self.config.workers} method workers")
+        executor = ProcessMethodExecutor(self.config_filename,
+                                         self.config.workers)
+        self.method_manager.method_digests.update(
+            executor.get_method_digests())
+        return executor
+
+    def collect_method_results(self, pending, wait_all=False):
+        # stores the finished results, waits until at least one task is
+        # done (or all of them when wait_all is set)
+        if not pending:
+            return
+        return_when = ALL_COMPLETED if wait_all else FIRST_COMPLETED
+        done, _ = wait(list(pending), return_when=return_when)
+        for future in done:
+            method_name, tasks = pending.pop(future)
+            self.store_batch_results(method_name, tasks, future)
+
+    def store_batch_results(self, method_name, tasks, future):
+        # future is the finished executor future of the batch
+        exp_names = ", ".join(exp_name for exp_name, _ in tasks)
+        try:
+            results, seconds, stages = future.result()
+        except Exception as ex:
+            # the whole batch fails with its run
+            for exp_name, result_key in tasks:
+                self.record_failed_task(method_name, exp_name, result_key,
+                                        ex)
+            return
+        self.profiler.add_task_stages(method_name, exp_names, stages)
+        self.logger.info(f"finished {method_name}[{exp_names}] "
+                         f"in {seconds:.2f}s")
+        # the time of a batch is split evenly between its experiments
+        seconds /= len(tasks)
+        for (exp_name, result_key), res in zip(tasks, results):
+            res.result_key = result_key
+            self.add_unsaved_task(method_name, exp_name, result_key, seconds)
+            if self.storage.buffer_method_results(res, method_name,
+                                                  exp_name):
+                self.flush_method_results()
+
+    def flush_method_results(self):
+        # one bulk write of the buffered results of any methods, profiled
+        # as a stage of its own, the written tasks go to the manifest
+        if self.storage.has_buffered_results():
+            with self.profiler.stage("flush"):
+                self.storage.flush_method_results()
+        self.save_manifest_tasks()
+
+    def add_unsaved_task(self, method_name, exp_name, result_key, seconds):
+        with self.tasks_lock:
+            self.unsaved_tasks.append((method_name, exp_name, result_key,
+                                       seconds))
+
+    def record_failed_task(self, method_name, exp_name, result_key, ex):
+        # a failing method is recorded and the benchmark goes on
+        if not isinstance(ex, MethodTaskFailure):
+            ex = MethodTaskFailure("error", f"{type(ex).__name__}: {ex}")
+        failure = ex.to_dict()
+        failure['method_name'] = method_name
+        failure['experiment_name'] = exp_name
+        self.failed_tasks.append(failure)
+        self.logger.error(f"{method_name}[{exp_name}] failed: "
+                          f"{ex.reason}")
+        if self.manifest is not None:
+            method_digest = self.method_manager.get_method_digest(
+                method_name)
+            self.manifest.mark_task_failed(method_name, exp_name,
+                                           method_digest, result_key,
+                                           failure)
+            self.manifest.save()
+
+    def save_manifest_tasks(self):
+        # tasks are only recorded once their results are written
+        with self.tasks_lock:
+            tasks = self.unsaved_tasks
+            self.unsaved_tasks = []
+        if self.manifest is None or not tasks:
+            return
+        for method_name, exp_name, result_key, seconds in tasks:
+            method_digest = self.method_manager.get_method_digest(
+                method_name)
+            self.manifest.mark_task_done(method_name, exp_name,
+                                         method_digest, result_key,
+                                         seconds)
+        self.manifest.save()
+
+    def is_task_done(self, method_name, exp_name, result_key):
+        if self.manifest is None:
+            return False
+        method_digest = self.method_manager.get_method_digest(method_name)
+        if self.manifest.is_task_done(method_name, exp_name, method_digest,
+                                      result_key):
+            return True
+        if self.config.retry_failed_tasks:
+            return False
+        return self.manifest.is_task_failed(method_name, exp_name,
+                                            method_digest, result_key)
+
+    def get_source_methods(self):
+        # execution map inverted: data source -> methods to run on it
+        source_methods = {}
+        for method_name, sources in self.get_execution_map().items():
+            for source in sources:
+                if source not in source_methods:
+                    source_methods[source] = []
+                source_methods[source].append(method_name)
+        return source_methods
+
     def generate_method_results(self):
-        execution_map = self.get_execution_map()
-        data_source_cache = {}
-        for method_name, execution_data in execution_map.items():
-            for source in execution_data:
-                self.logger.info(f"get data from: {source}")
-                if source in data_source_cache:
-                    experiments = data_source_cache[source]
-                geos = self.storage.get_geo({'source': source})
-                experiments = []
-                for exp in geos:
-                    gen_data = GeneData()
-                    gen_data.gene_input = GeneDiffInput.from_geo_data(exp)
-                    gen_data.name = exp.name
-                    experiments.append(gen_data)
-                data_source_cache[source] = experiments
-                num_experiments = len(experiments)
-
-                for id, gene_data in enumerate(experiments):
-                    if self.storage.has_method_results(method_name,
-                                                       gene_data.name):
-                        exp_name = gene_data.name
-                        self.logger.info(f"already computed [{exp_name}]")
-                        continue
-                    self.logger.info(f"running {id+1}/{num_experiments}")
-                    self.logger.info(f"{method_name}[{gene_data.name}]")
-
-                    res = self.method_manager.run(gene_data.gene_input,
-                                                  method_name)
-                    self.storage.insert_method_results(res,
-                                                       method_name,
-                                                       gene_data.name)
-
-    def generate_comparison_single(self, method_name, geodata, run, cache):
-        filter = {'method_name': method_name,
-                  'experiment_name': geodata.name}
-        res = self.storage.get_method_results(filter)[0]
-        for validation_set in run.validation_sets:
+        # experiment major: every experiment is loaded and preprocessed
+        # once and given to all the methods that still need it
+        source_methods = self.get_source_methods()
+        executor = self.create_executor()
+        pending = {}
+        try:
+            if self.config.pipeline.enabled:
+                orchestrator = MethodResultsOrchestrator(
+                    self, executor, self.config.pipeline)
+                orchestrator.run(source_methods)
+            else:
+                for source in sorted(source_methods.keys()):
+                    self.logger.info(f"get data from: {source}")
+                    self.run_methods_on_source(executor, pending, source,
+                                               source_methods[source])
+                # the last batches of every method are not full
+                for method_name in list(self.batches.keys()):
+                    self.submit_batch(executor, pending, method_name)
+                self.collect_method_results(pending, wait_all=True)
+        finally:
+            executor.shutdown()
+            self.flush_method_results()
+            self.profiler.export()
+        if self.failed_tasks:
+            self.logger.warning(f"{len(self.failed_tasks)} method runs "
+                                f"failed")
+        if self.manifest is not None:
+            for method_name, timing in self.manifest.get_timings().items():
+                self.logger.info(f"{method_name}: {timing['tasks']} tasks "
+                                 f"in {timing['seconds']:.2f}s")
+
+    def get_pending_methods(self, gene_input, exp_name, method_names):
+        pending_methods = []
+        for method_name in method_names:
+            # stored results are reused only if the method config,
+            # its model files and the input are all unchanged
+            with self.profiler.stage("result_key", method_name, exp_name):
+                result_key = self.method_manager.get_result_key(gene_input,
+                                                                method_name)
+            # tasks recorded in the manifest need no storage query
+            if self.is_task_done(method_name, exp_name, result_key):
+                continue
+            if self.storage.has_method_results(method_name,
+                                               exp_name,
+                                               result_key):
+                self.logger.info(f"already computed "
+                                 f"{method_name}[{exp_name}]")
+                self.add_unsaved_task(method_name, exp_name, result_key,
+                                      None)
+                continue
+            pending_methods.append((method_name, result_key))
+        return pending_methods
+
+    def run_methods_on_source(self, executor, pending, source,
+                              method_names):
+        # only the meta data is streamed here, the expression
+        # matrices are loaded one experiment at a time
+        experiments = self.storage.iter_geo({'source': source},
+                                            meta_only=True)
+        for id, meta_data in enumerate(experiments):
+            gene_input, pending_methods = self.prepare_experiment(
+                source, meta_data.name, method_names)
+            if pending_methods:
+                self.logger.info(f"running {id+1} from {source}")
+            for method_name, result_key in pending_methods:
+                is_full = self.add_to_batch(method_name, gene_input,
+                                            meta_data.name, result_key)
+                if is_full:
+                    self.submit_batch(executor, pending, method_name)
+
+    def prepare_experiment(self, source, exp_name, method_names):
+        # (input, [(method name, result key)]) of the methods that still
+        # have to run on the experiment, (None, []) when none has to
+        with self.profiler.stage("load", experiment_name=exp_name):
+            geo = self.storage.get_geo({'source': source,
+                                        'name': exp_name})[0]
+        with self.profiler.stage("preprocess", experiment_name=exp_name):
+            gene_input = GeneDiffInput.from_geo_data(geo)
+        pending_methods = self.get_pending_methods(gene_input,
+                                                   exp_name,
+                                                   method_names)
+        if not pending_methods:
+            self.logger.info(f"already computed [{exp_name}]")
+            return None, []
+        return gene_input, pending_methods
+
+    def add_to_batch(self, method_name, gene_input, exp_name, result_key):
+        # the input is kept only by the batches that still need it,
+        # returns True when the batch of the method is full
+        self.logger.info(f"{method_name}[{exp_name}]")
+        batch = self.batches.setdefault(method_name, [])
+        batch.append((gene_input, exp_name, result_key))
+        return len(batch) >= self.config.batch_size
+
+    def pop_batch(self, method_name):
+        # (inputs, [(experiment name, result key)], profile path)
+        batch = self.batches.pop(method_name)
+        gene_inputs = [gene_input for gene_input, _, _ in batch]
+        tasks = [(exp_name, result_key) for _, exp_name, result_key in batch]
+        profile_path = self.profiler.get_profile_path(method_name,
+                                                      tasks[0][0])
+        return gene_inputs, tasks, profile_path
+
+    def submit_batch(self, executor, pending, method_name):
+        gene_inputs, tasks, profile_path = self.pop_batch(method_name)
+        future = executor.submit(gene_inputs, method_name, profile_path)
+        pending[future] = (method_name, tasks)
+        if len(pending) >= self.config.max_pending_tasks:
+            self.collect_method_results(pending)
+
+    def get_validation(self, validation_set, pf, cache):
+        if validation_set not in cache:
             self.logger.info(f"Getting validation data for {validation_set}")
-            if validation_set not in cache:
-                valid = self.storage.get_validation_data(validation_set,
-                                                         geodata.pf)
-                cache[validation_set] = valid
+            cache[validation_set] = self.storage.get_validation_data(
+                validation_set, pf)
+        return cache[validation_set]
 
-            valid = cache[validation_set]
+    def generate_comparison_single(self, method_name, experiments, run,
+                                   cache):
+        # experiments are (name, pf) pairs, the method results are
+        # streamed in batches and go straight to the metrics
+        experiment_pf = dict(experiments)
+        results = self.storage.iter_method_results(method_name,
+                                                   experiment_pf.keys())
+        found = 0
+        for experiment_name, res in results:
+            found += 1
+            pf = experiment_pf[experiment_name]
+            with self.profiler.stage("metric_add", method_name,
+                                     experiment_name):
+                for validation_set in run.validation_sets:
+                    valid = self.get_validation(validation_set, pf, cache)
+                    self.metric_manager.add(pf,
+                                            method_name,
+                                            valid,
+                                            res)
+        if found < len(experiment_pf):
+            missing = len(experiment_pf) - found
+            self.logger.warning(f"{method_name} has no results for "
+                                f"{missing} experiments")
 
-            self.logger.info("Adding data to metrics")
-            self.metric_manager.add(geodata.pf,
-                                    method_name,
-                                    valid,
-                                    res)
+    def get_run_experiments(self, run):
+        # only the experiment names and perturbation factors are kept
+        experiments = []
+        for data_source in run.data_sources:
+            for meta_data in self.storage.iter_geo({
+                    "source": data_source}, meta_only=True):
+                experiments.append((meta_data.name, meta_data.pf))
+        return experiments
+
+    def compare_method(self, run, key, method_name, experiments, cache):
+        start = time.perf_counter()
+        self.generate_comparison_single(method_name, experiments, run, cache)
+        if self.manifest is None:
+            return
+        # the accumulated metrics of the method are saved next to the
+        # manifest, metrics that can't be saved are recomputed for the
+        # whole group on resume
+        state = self.metric_manager.get_state(method_name)
+        if state is None:
+            return
+        self.manifest.save_metrics_state(run.name, key, method_name, state)
+        self.manifest.mark_compared(run.name, key, method_name,
+                                    time.perf_counter() - start)
+        self.manifest.save()
 
     def generate_comparisons(self):
         validation_cache = {}
         self.logger.info("collecting metrics")
+        if self.manifest is not None:
+            for state in self.manifest.load_metrics_states():
+                self.metric_manager.set_state(state)
         for run in self.config.runs:
-            all_geos = []
-            for data_source in run.data_sources:
-                all_geos.extend(self.storage.get_geo({
-                    "source": data_source}))
+            experiments = None
             for key, data in self.config.method_groups.items():
+                if (self.manifest is not None and
+                        self.manifest.is_evaluated(run.name, key)):
+                    self.logger.info(f"already evaluated {run.name}[{key}]")
+                    continue
+                if experiments is None:
+                    experiments = self.get_run_experiments(run)
                 for method_name in data.methods:
-                    for geodata in all_geos:
-                        self.generate_comparison_single(method_name,
-                                                        geodata,
-                                                        run,
-                                                        validation_cache)
+                    if (self.manifest is not None and
+                            self.manifest.is_compared(run.name, key,
+                                                      method_name)):
+                        continue
+                    self.compare_method(run, key, method_name, experiments,
+                                        validation_cache)
                 self.logger.info(f"evaluating metrics for {key}")
-                self.metric_manager.evaluate(key)
+                start = time.perf_counter()
+                with self.profiler.stage("evaluate"):
+                    self.metric_manager.evaluate(key)
+                if self.manifest is not None:
+                    self.manifest.mark_evaluated(run.name, key,
+                                                 time.perf_counter() - start)
+                    self.manifest.save()
+                    self.manifest.remove_metrics_states(run.name, key)
+        self.metric_manager.shutdown()
+        self.profiler.export()
         self.logger.info("finished generating metrics")
+        self.logger.info(f"storage cache {self.storage.get_cache_stats()}")
@@ -1,6 +1,81 @@
+import base64
+import hashlib
 from json import JSONEncoder
 import numpy as np
-import random
+
+
+class VocabularyConflict(Exception):
+    # the same id was given to different genes by two vocabularies (ex:
+    # two processes extending one stored vocabulary at the same time)
+    pass
+
+
+class GeneVocabulary:
+    # interned, lower cased gene names shared by experiments, results and
+    # validation sets, a gene is referred to by its position in the table.
+    # Ids are only ever appended, stored vocabularies are merged on save
+    ID_DTYPE = np.dtype('<i4')
+    UNKNOWN_ID = -1
+
+    def __init__(self, json=None):
+        self.names = []
+        self.ids = {}
+        self.is_dirty = False
+        self.names_array = None
+        if json:
+            for name in json['genes']:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+
+    @staticmethod
+    def normalize(gene):
+        return str(gene).lower()
+
+    def intern(self, genes):
+        ids = np.empty(len(genes), dtype=GeneVocabulary.ID_DTYPE)
+        for idx, gene in enumerate(genes):
+            name = GeneVocabulary.normalize(gene)
+            gene_id = self.ids.get(name)
+            if gene_id is None:
+                gene_id = len(self.names)
+                self.ids[name] = gene_id
+                self.names.append(name)
+                self.names_array = None
+                self.is_dirty = True
+            ids[idx] = gene_id
+        return ids
+
+    def lookup(self, genes):
+        unknown = GeneVocabulary.UNKNOWN_ID
+        ids = [self.ids.get(GeneVocabulary.normalize(gene), unknown)
+               for gene in genes]
+        return np.array(ids, dtype=GeneVocabulary.ID_DTYPE)
+
+    def get_names(self, ids):
+        if self.names_array is None:
+            self.names_array = np.array(self.names, dtype=str)
+        return self.names_array[np.asarray(ids)]
+
+    def merge(self, names):
+        # reconciles with stored names: one of the two lists has to extend
+        # the other. Stored genes missing here are adopted (so new genes
+        # get ids after them), returns True when genes are missing from
+        # the stored names
+        common = min(len(self.names), len(names))
+        if self.names[:common] != list(names[:common]):
+            gene_id = next(idx for idx in range(common)
+                           if self.names[idx] != names[idx])
+            raise VocabularyConflict(
+                f"gene id {gene_id} is {self.names[gene_id]} here and "
+                f"{names[gene_id]} in the stored vocabulary")
+        for name in names[common:]:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.names_array = None
+        return len(self.names) > len(names)
+
+    def to_dict(self):
+        return {"genes": self.names}
 
 
 class GeneDiffValidation:
@@ -11,6 +86,23 @@ class GeneDiffValidation:
         else:
             self.data = []
             self.source = ""
+        self.vocabulary = None
+        self.gene_ids = {}
+
+    def intern(self, vocabulary: GeneVocabulary):
+        for genes in self.data.values():
+            vocabulary.intern(list(genes))
+
+    def get_gene_ids(self, pf, vocabulary: GeneVocabulary):
+        # interned ids of the genes linked to a perturbation factor,
+        # cached so every (method, experiment) pair reuses them
+        if self.vocabulary is not vocabulary:
+            self.vocabulary = vocabulary
+            self.gene_ids = {}
+        if pf not in self.gene_ids:
+            genes = list(self.data[pf])
+            self.gene_ids[pf] = np.unique(vocabulary.intern(genes))
+        return self.gene_ids[pf]
 
     def to_dict(self):
         return {
@@ -20,48 +112,117 @@ class GeneDiffValidation:
 
 
 class GeneListEntry:
+    __slots__ = ('gene_name', 'score')
+
     def __init__(self, gene_name, score):
         self.gene_name = gene_name
         self.score = score
 
 
 class GeneMethodResult:
+    # ranked genes and their scores are kept as two parallel arrays,
+    # GeneListEntry objects are only built when .result is accessed.
+    # Stored results may only hold gene ids, the names are then resolved
+    # through the vocabulary the storage attached to the result
+    # result_key identifies the method configuration and input the result
+    # was computed from, None for results stored before it existed
+    __slots__ = ('_genes', 'gene_ids', 'vocabulary', 'scores', 'valid',
+                 'result_key')
+    SCORE_DTYPE = np.dtype('<f4')
+
     def __init__(self, config=None):
+        self._genes = None
+        self.gene_ids = None
+        self.vocabulary = None
+        self.result_key = None
+        if config is not None:
+            self.result_key = config.get('result_key')
         if config is None:
-            self.result = []
+            self._genes = np.array([], dtype=str)
+            self.scores = np.array([], dtype=GeneMethodResult.SCORE_DTYPE)
             self.valid = False
+        elif 'results' in config:
+            # verbose format, a list of {gene_name, score} entries
+            result_list = config['results']
+            self._genes = np.array([x['gene_name'] for x in result_list],
+                                   dtype=str)
+            self.scores = np.array([x['score'] for x in result_list],
+                                   dtype=GeneMethodResult.SCORE_DTYPE)
+            self.valid = True
         else:
+            # compact format, scores are a base64 float32 vector and genes
+            # are either names or base64 int32 vocabulary ids
+            if 'gene_ids' in config:
+                raw_ids = base64.b64decode(config['gene_ids'])
+                self.gene_ids = np.frombuffer(raw_ids,
+                                              dtype=GeneVocabulary.ID_DTYPE)
+            else:
+                self._genes = np.array(config['genes'], dtype=str)
+            raw_scores = base64.b64decode(config['scores'])
+            self.scores = np.frombuffer(raw_scores,
+                                        dtype=GeneMethodResult.SCORE_DTYPE)
             self.valid = True
-            result_list = config['results']
-            self.result = []
-            for result in result_list:
-                self.result.append(GeneListEntry(
-                    **result
-                ))
 
-    def to_dict(self):
-        array = []
-        for x in self.result:
-            array.append(x.__dict__)
+    @property
+    def genes(self):
+        if self._genes is None:
+            self._genes = self.vocabulary.get_names(self.gene_ids)
+        return self._genes
+
+    @genes.setter
+    def genes(self, genes):
+        self._genes = genes
+        self.gene_ids = None
+
+    @property
+    def result(self):
+        return [GeneListEntry(gene, score)
+                for gene, score in zip(self.genes.tolist(),
+                                       self.scores.tolist())]
 
-        ret_dict = {'results': array}
+    def intern(self, vocabulary: GeneVocabulary):
+        if self.gene_ids is None or self.vocabulary is not vocabulary:
+            self.gene_ids = vocabulary.intern(self.genes)
+            self.vocabulary = vocabulary
+
+    def get_gene_ids(self, vocabulary: GeneVocabulary):
+        if self.gene_ids is not None and self.vocabulary is vocabulary:
+            return self.gene_ids
+        gene_ids = vocabulary.lookup(self.genes)
+        if np.all(gene_ids != GeneVocabulary.UNKNOWN_ID):
+            self.gene_ids = gene_ids
+            self.vocabulary = vocabulary
+        return gene_ids
+
+    def to_dict(self):
+        scores = np.ascontiguousarray(self.scores,
+                                      dtype=GeneMethodResult.SCORE_DTYPE)
+        ret_dict = {
+            'scores': base64.b64encode(scores.tobytes()).decode('ascii')
+        }
+        if self.gene_ids is not None:
+            gene_ids = np.ascontiguousarray(self.gene_ids,
+                                            dtype=GeneVocabulary.ID_DTYPE)
+            ret_dict['gene_ids'] = base64.b64encode(
+                gene_ids.tobytes()).decode('ascii')
+        else:
+            ret_dict['genes'] = self.genes.tolist()
+        if self.result_key is not None:
+            ret_dict['result_key'] = self.result_key
         return ret_dict
 
     @staticmethod
     def from_pair_list(pair_list):
-        new_object = GeneMethodResult()
-        for x in pair_list:
-            entry = GeneListEntry(x[0], x[1])
-            new_object.result.append(entry)
-        new_object.valid = True
-        return new_object
+        genes = [x[0] for x in pair_list]
+        scores = [x[1] for x in pair_list]
+        return GeneMethodResult.from_separate_lists(genes, scores)
 
     @staticmethod
     def from_separate_lists(genes, scores):
         new_object = GeneMethodResult()
-        for idx, gene in enumerate(genes):
-            entry = GeneListEntry(gene, scores[idx])
-            new_object.result.append(entry)
+        new_object.genes = np.asarray(genes, dtype=str)
+        new_object.scores = np.asarray(scores,
+                                       dtype=GeneMethodResult.SCORE_DTYPE)
         new_object.valid = True
         return new_object
 
@@ -91,6 +252,21 @@ class GeoData:
         self.genes = config['genes']
         self.pf = config['pf']
 
+    @staticmethod
+    def from_meta_data(meta_data):
+        config = dict(meta_data)
+        config['perturbed_array'] = None
+        config['control_array'] = None
+        return GeoData(config)
+
+    def has_big_data(self):
+        return (self.control_array is not None and
+                self.perturbed_array is not None)
+
+    def is_memory_mapped(self):
+        return (isinstance(self.control_array, np.memmap) or
+                isinstance(self.perturbed_array, np.memmap))
+
     def get_as_dict(self):
         data = self.get_meta_data()
         data.update(self.get_big_data())
@@ -119,28 +295,41 @@ class GeneDiffInput:
         self.control = np.array([])
         self.perturbed = np.array([])
         self.genes = set([])
+        self.digest = None
+
+    def get_digest(self):
+        # values are hashed as float32 so the same experiment loaded from
+        # a json (float64) or a binary (float32) provider gets one digest
+        if self.digest is None:
+            sha = hashlib.sha1()
+            for array in [self.control, self.perturbed]:
+                array = np.ascontiguousarray(array, dtype='<f4')
+                sha.update(str(array.shape).encode('utf-8'))
+                sha.update(array.tobytes())
+            genes = "\n".join(str(gene).lower() for gene in self.genes)
+            sha.update(genes.encode('utf-8'))
+            self.digest = sha.hexdigest()
+        return self.digest
 
     @staticmethod
-    def from_geo_data(data: GeoData):
+    def from_geo_data(data: GeoData, max_replicates=6):
         input = GeneDiffInput()
-        # limit data to most important because we don't have
-        # enough memory to run the R methods with full data 
-        if len(data.control_array) < len(data.genes):
+        # transposing and slicing below only create views, so memory
+        # mapped experiments are not copied or read here
+        control = np.asarray(data.control_array)
+        perturbed = np.asarray(data.perturbed_array)
+        if len(control) < len(data.genes):
             # some experiments need to be transposed
-            control = np.array(data.control_array).T.tolist()
-            perturbed = np.array(data.perturbed_array).T.tolist()
-        else:
-            control = data.control_array
-            perturbed = data.perturbed_array
-        control = [x[:6] for x in control]
-        perturbed = [x[-6:] for x in perturbed]
-
-        input.control = np.array(control)
-        input.perturbed = np.array(perturbed)
-        input.genes = data.genes
-
-        for idx, gene_name in enumerate(input.genes):
-            if not isinstance(gene_name, str):
-                input.genes[idx] = f"fake_{random.randint(0,9999)}"
-
+            control = control.T
+            perturbed = perturbed.T
+        # limit data to most important because we don't have
+        # enough memory to run the R methods with full data
+        input.control = control[:, :max_replicates]
+        input.perturbed = perturbed[:, -max_replicates:]
+        # missing or numeric gene symbols get placeholders named after
+        # their row, so the digest (and the result keys) stay the same
+        # between runs, the shared (cached) geo data is not modified
+        input.genes = [gene_name if isinstance(gene_name, str)
+                       else f"fake_{idx}"
+                       for idx, gene_name in enumerate(data.genes)]
         return input
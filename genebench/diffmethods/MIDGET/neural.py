@@ -5,6 +5,7 @@ import random
 from genebench.datatypes import GeneDiffInput, GeneMethodResult
 from genebench.diffmethods.MIDGET.common import MIDGET
 from genebench.utils import Utils
+from genebench.profiler import Profiler
 
 class MIDGETNeuralConfig:
     def __init__(self,
@@ -38,9 +39,17 @@ class MIDGETNeural(MIDGET):
         model_path = os.path.join(self.config.output_folder,
                                   self.config.model_name,
                                   "model")
+        self.model_path = model_path
         self.logger.info(f"Loading model: {model_path}")
         self.model = tf.keras.models.load_model(model_path)
 
+    def get_model_files(self):
+        # a saved keras model is a folder (graph, variables, assets)
+        model_files = []
+        for root, _, files in os.walk(self.model_path):
+            model_files.extend(os.path.join(root, name) for name in files)
+        return sorted(model_files)
+
     def build_model(self):
         pass
 
@@ -85,14 +94,31 @@ class MIDGETNeural(MIDGET):
         self.logger.info("Done training")
 
     def run(self, input: GeneDiffInput) -> GeneMethodResult:
-        A = input.control
-        B = input.perturbed
-        genes = input.genes
+        return self.run_batch([input])[0]
+
+    def run_batch(self, inputs) -> list:
+        # the feature vectors of all the inputs go through a single
+        # predict call
+        if not inputs:
+            return []
         self.logger.info("preparing feature vectors")
-        X = self.do_run_feature_vectors(A, B, genes)
+        with Profiler.task_stage("prepare"):
+            X = [self.do_run_feature_vectors(input.control,
+                                             input.perturbed,
+                                             input.genes)
+                 for input in inputs]
+            X = np.concatenate(X)
         self.logger.info("doing predictions")
-        shape = self.model.predict(X)
-        shape = np.sum(shape, axis=1)
-        genes, scores = self.sort(genes, shape)
-        scores = [x.item() for x in scores]
-        return GeneMethodResult.from_separate_lists(genes, scores)
+        with Profiler.task_stage("predict"):
+            shape = self.model.predict(X)
+        results = []
+        with Profiler.task_stage("postprocess"):
+            shape = np.sum(shape, axis=1)
+            offsets = np.cumsum([len(input.genes) for input in inputs])
+            for input, input_shape in zip(inputs,
+                                          np.split(shape, offsets[:-1])):
+                genes, scores = self.sort(input.genes, input_shape)
+                scores = [x.item() for x in scores]
+                results.append(GeneMethodResult.from_separate_lists(
+                    genes, scores))
+        return results
@@ -1,8 +1,10 @@
 import os
+import numpy as np
 import xgboost as xgb
 from sklearn.metrics import accuracy_score
 import random
 from genebench.utils import Utils
+from genebench.profiler import Profiler
 from genebench.datatypes import GeneDiffInput, GeneMethodResult
 from genebench.diffmethods.MIDGET.common import MIDGET
 
@@ -31,6 +33,7 @@ class MIDGETXgBoost(MIDGET):
         model_path = os.path.join(self.config.model_folder,
                                   self.config.model_name,
                                   'model.json')
+        self.model_path = model_path
         self.logger.info(f"pir: Loading model: {model_path}")
         if os.path.isfile(model_path):
             bst = xgb.Booster(self.config.param)
@@ -40,6 +43,11 @@ class MIDGETXgBoost(MIDGET):
             self.logger.warning(f"No model located in {model_path}")
         pass
 
+    def get_model_files(self):
+        if os.path.isfile(self.model_path):
+            return [self.model_path]
+        return []
+
     def build_model(self):
         pass
 
@@ -73,14 +81,30 @@ class MIDGETXgBoost(MIDGET):
         bst.save_model(os.path.join(model_path, "model.json"))
 
     def run(self, input: GeneDiffInput) -> GeneMethodResult:
-        A = input.control
-        B = input.perturbed
-        genes = input.genes
+        return self.run_batch([input])[0]
+
+    def run_batch(self, inputs) -> list:
+        # the feature vectors of all the inputs go through a single
+        # predict call
+        if not inputs:
+            return []
         self.logger.info('preparing feature vectors')
-        X = self.do_run_feature_vectors(A, B, genes)
+        with Profiler.task_stage("prepare"):
+            X = [self.do_run_feature_vectors(input.control,
+                                             input.perturbed,
+                                             input.genes)
+                 for input in inputs]
+            X = xgb.DMatrix(np.concatenate(X))
         self.logger.info('doing predictions')
-        X = xgb.DMatrix(X)
-        scores = self.model.predict(X)
-        genes, scores = self.sort(genes, scores)
-        scores = [x.item() for x in scores]
-        return GeneMethodResult.from_separate_lists(genes, scores)
+        with Profiler.task_stage("predict"):
+            scores = self.model.predict(X)
+        results = []
+        with Profiler.task_stage("postprocess"):
+            offsets = np.cumsum([len(input.genes) for input in inputs])
+            for input, input_scores in zip(inputs,
+                                           np.split(scores, offsets[:-1])):
+                genes, input_scores = self.sort(input.genes, input_scores)
+                input_scores = [x.item() for x in input_scores]
+                results.append(GeneMethodResult.from_separate_lists(
+                    genes, input_scores))
+        return results
@@ -1,12 +1,16 @@
+# libraries are loaded once, when the script is sourced
+library(GeoDE)
 options("experssion" = 500000)
 
-characteristic_direction<- function(data, class, genes) {
-  library(GeoDE)
-  class <- factor(data.matrix(class))
-  uniV <- GeoDE::chdirAnalysis(data, class,gammas=1.0)
-  return_res <- as.data.frame(uniV$results)
-
-  return(return_res)
+# data_mtx is the numeric genes x samples matrix and class the integer
+# sample classes, returns a (gene row, score) matrix sorted by score
+characteristic_direction<- function(data_mtx, class) {
+  # the genes are named by their row so duplicated names can't mix up
+  rows <- as.character(seq_len(nrow(data_mtx)))
+  data <- data.frame(rows, data_mtx, stringsAsFactors = FALSE)
+  uniV <- GeoDE::chdirAnalysis(data, factor(class), gammas=1.0)
+  res <- uniV$results[[1]]
+  return(cbind(as.numeric(names(res)), as.numeric(res)))
 }
 test<-function(){
   
@@ -1,13 +1,14 @@
+# libraries are loaded once, when the script is sourced
+library(limma)
 options("experssion" = 500000)
 
-calculate_limma <- function(data, class) {
-  library(limma)
-  data_mtx = data.matrix(data)
-  class_mtx = data.matrix(class)
-  design <- factor(class_mtx)
+# data_mtx is the numeric genes x samples matrix and class the integer
+# sample classes, returns the adjusted p values in gene order
+calculate_limma <- function(data_mtx, class) {
+  design <- factor(class)
   design_matrix = model.matrix(~ design)
   fit <- lmFit(data_mtx, design_matrix)
   fit <- eBayes(fit)
-  return(topTable(fit,sort="none",n=Inf))
+  return(topTable(fit,sort="none",n=Inf)$adj.P.Val)
 }
 
@@ -1,3 +1,6 @@
+# libraries are loaded once, when the script is sourced
+library(DT)
+library(samr)
 options("experssion" = 500000)
 
 get_fake_data_mtx<- function() {
@@ -15,22 +18,27 @@ get_fake_data_mtx<- function() {
   return(data)
 }
 
-calculate_sam <- function(data_mtx, class_mtx, gene_names) {
-  library(DT)
+# data_mtx is the numeric genes x samples matrix and class the integer
+# sample classes, returns a (gene row, score) matrix of the genes in the
+# siggenes table at delta 0
+calculate_sam <- function(data_mtx, class) {
   # source('http://bioconductor.org/biocLite.R') # Import biocLite() function into R environment biocLite('limma')
-  library(samr)  # Load the library
-  geneids <- as.character(1:nrow(data_mtx))
+  # the genes are named by their row so duplicated names can't mix up
+  geneids <- as.character(seq_len(nrow(data_mtx)))
   
-  data_param <- list(x = data_mtx, y = class_mtx, geneid=geneids,
-               genenames=gene_names, logged2 = TRUE)
+  data_param <- list(x = data_mtx, y = class, geneid=geneids,
+               genenames=geneids, logged2 = TRUE)
   samr.obj <- samr(data_param, resp.type = "Two class unpaired", assay.type=c("array"),testStatistic="wilcoxon",regression.method="ranks"
 ,nperms = 100)
   delta.table <- samr.compute.delta.table(samr.obj) 
   del <- 0
   siggenes.table<-samr.compute.siggenes.table(samr.obj, del, data_param, delta.table)
-  data_frame_return = as.data.frame(do.call(rbind, siggenes.table))
-
-  return(data_frame_return)
+  genes <- rbind(siggenes.table$genes.up, siggenes.table$genes.lo)
+  if (is.null(genes)) {
+    return(matrix(numeric(0), ncol = 2))
+  }
+  return(cbind(as.numeric(genes[, "Gene ID"]),
+               as.numeric(genes[, "Score(d)"])))
 }
 
 test_func <- function() {
@@ -48,8 +56,7 @@ test_func <- function() {
   
   y<-c(rep(1,num_experiments/2),rep(2,num_experiments/2))
   
-  gene_names <- rbind(c('g1','g2','g3','g4','g5','g6','g7','g8','g9','g10'))
-  result =calculate_sam(data, y, gene_names) 
+  result =calculate_sam(data, y) 
   
   return(result)
 }
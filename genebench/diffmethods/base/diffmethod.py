@@ -14,6 +14,16 @@ class DiffMethod:
     def run(self, input: GeneDiffInput) -> GeneMethodResult:
         pass
 
+    def run_batch(self, inputs) -> list:
+        # one result per input, methods override it when several inputs
+        # can share fixed costs (model predict, R setup, vectorizing)
+        return [self.run(input) for input in inputs]
+
+    def get_model_files(self):
+        # files the results depend on besides the config (trained models,
+        # scripts), their content is part of the result key
+        return []
+
     def sort(self, genes, values, is_reversed=True):
         genes = np.array(list(genes))
         values = np.array(values)
@@ -1,17 +1,42 @@
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import rpy2.robjects as ro
-from rpy2.robjects import (pandas2ri, numpy2ri)
+from rpy2.robjects import numpy2ri
 from rpy2.robjects.conversion import localconverter
 from genebench.datatypes import GeneDiffInput, GeneMethodResult
 from genebench.utils import Utils
+from genebench.profiler import Profiler
 from genebench.diffmethods.base.diffmethod import DiffMethod
 
 class RDiffMethodConfig:
     def __init__(self,
                  file_name,
-                 method_name):
+                 method_name,
+                 function_name=None,
+                 workers=0):
         self.file_name = file_name
         self.method_name = method_name
+        # R function defined by the script that runs the method
+        self.function_name = function_name
+        # workers > 0 runs the method in that many R processes
+        self.workers = workers
+
+
+class RWorker:
+    # state of an R worker process: one method with its script sourced
+    # and its libraries loaded
+    method = None
+
+    @staticmethod
+    def setup(method_class, config: RDiffMethodConfig):
+        RWorker.method = method_class()
+        RDiffMethod.setup(RWorker.method, config)
+
+    @staticmethod
+    def run(input: GeneDiffInput):
+        return RWorker.method.run(input)
 
 
 class RDiffMethod(DiffMethod):
@@ -23,34 +48,85 @@ class RDiffMethod(DiffMethod):
         self.abs_r_file_path = os.path.join(current_file_path,
                                             'R',
                                             r_file_name)
+        self.pool = None
+        if self.config.workers > 0:
+            # long lived R processes, spawned because R is not fork safe
+            worker_config = RDiffMethodConfig(config.file_name,
+                                              config.method_name,
+                                              config.function_name)
+            context = multiprocessing.get_context('spawn')
+            self.pool = ProcessPoolExecutor(self.config.workers,
+                                            mp_context=context,
+                                            initializer=RWorker.setup,
+                                            initargs=(type(self),
+                                                      worker_config))
+        else:
+            self.start_session()
+
+    def start_session(self):
+        # the script is sourced (and its libraries loaded) once, the
+        # method function and the converters are kept for every run
+        self.r = ro.r
+        self.r.source(self.abs_r_file_path)
+        self.r_function = None
+        if self.config.function_name:
+            self.r_function = ro.globalenv[self.config.function_name]
+        self.converters = self.get_converters()
+
+    def get_model_files(self):
+        return [self.abs_r_file_path]
 
     def train(self, A, B, genes):
         self.logger.info(f'no training for method {self.config.method_name}')
 
     def prepare_data(self, A, B, genes):
-        pass
+        # a single float64 genes x samples matrix in R (column major)
+        # order, so numpy2ri hands its buffer to R without another copy,
+        # and the integer sample classes (1 control, 2 perturbed)
+        num_control = np.shape(A)[1]
+        num_samples = num_control + np.shape(B)[1]
+        data = np.empty((len(genes), num_samples), dtype=np.float64,
+                        order='F')
+        data[:, :num_control] = A
+        data[:, num_control:] = B
+        classes = np.ones(num_samples, dtype=np.int32)
+        classes[num_control:] = 2
+        return [data, classes, genes]
 
-    def run_custom_method(r, data_df, mask, gene_df):
+    def run_custom_method(self, r, data, classes, genes):
+        # (genes, values) computed by the R function, numpy arrays come
+        # back from R as numpy arrays
         pass
 
     def get_converters(self):
-        return ro.default_converter + pandas2ri.converter
+        return ro.default_converter + numpy2ri.converter
 
     def post_proces_results(self, genes, values):
         return genes, values
 
     def run(self, input: GeneDiffInput) -> GeneMethodResult:
-        numpy2ri.activate()
-        pandas2ri.activate()
-        r = ro.r
-        r.source(self.abs_r_file_path)
+        if self.pool is not None:
+            return self.pool.submit(RWorker.run, input).result()
+        return self.run_in_session(input)
+
+    def run_batch(self, inputs) -> list:
+        if self.pool is None:
+            return [self.run_in_session(input) for input in inputs]
+        # the inputs are spread over the R workers
+        futures = [self.pool.submit(RWorker.run, input) for input in inputs]
+        return [future.result() for future in futures]
+
+    def run_in_session(self, input: GeneDiffInput) -> GeneMethodResult:
         A = input.control
         B = input.perturbed
         genes = input.genes
-        data_df, mask, gene_df = self.prepare_data(A, B, genes)
-        converters = self.get_converters()
-        with localconverter(converters):
+        with Profiler.task_stage("prepare"):
+            data, classes, genes = self.prepare_data(A, B, genes)
+        with localconverter(self.converters):
             self.logger.info(f'running method {self.config.method_name}')
-            genes, values = self.run_custom_method(r, data_df, mask, gene_df)
-            genes, values = self.post_proces_results(genes, values)
+            with Profiler.task_stage("r_call"):
+                genes, values = self.run_custom_method(self.r, data, classes,
+                                                       genes)
+            with Profiler.task_stage("postprocess"):
+                genes, values = self.post_proces_results(genes, values)
             return GeneMethodResult.from_separate_lists(genes, values)
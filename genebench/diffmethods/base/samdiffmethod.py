@@ -0,0 +1,15 @@
+import numpy as np
+import scipy.stats
+from genebench.diffmethods.base.diffmethod import DiffMethod
+
+
+class SAMDiffMethod(DiffMethod):
+    # scores of the SAM methods (R samr and numpy): the d statistic of every
+    # gene is turned into 1 - p, the genes below 0.95 are pushed down
+
+    def post_proces_results(self, genes, values):
+        n = len(genes)
+        pvalues = scipy.stats.t.sf(np.abs(values), n-1) * 2
+        values = np.ones(n) - pvalues
+        values = np.where(values >= 0.95, values, np.clip(values - 0.5, 0, 1))
+        return self.sort(genes, values)
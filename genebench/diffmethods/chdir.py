@@ -1,5 +1,4 @@
 import numpy as np
-import pandas as pd
 
 from genebench.diffmethods.base.rdiffmethod import RDiffMethod
 from genebench.diffmethods.base.rdiffmethod import RDiffMethodConfig
@@ -10,22 +9,15 @@ from genebench.diffmethods.base.rdiffmethod import RDiffMethodConfig
 class ChDir(RDiffMethod):
     def setup(self, config):
         config = RDiffMethodConfig(file_name='characteristic_direction.r',
-                                   method_name='CharacteristicDirection')
+                                   method_name='CharacteristicDirection',
+                                   function_name='characteristic_direction',
+                                   workers=config.get('workers', 0))
         super().setup(config)
 
-    def prepare_data(self, A, B, genes):
-        pdA = pd.DataFrame(A)
-        pdA.insert(0, "gene_names", genes)
-        pdB = pd.DataFrame(B)
-        data_df = pd.concat([pdA, pdB], axis=1, ignore_index=True)
-        mask = ([1.0] * (pdA.shape[1]-1))
-        mask.extend([2.0] * pdB.shape[1])
-        mask = pd.DataFrame(mask)
-        gene_df = pd.DataFrame(genes)
-        return [data_df, mask, gene_df]
-
-    def run_custom_method(self, r, data, mask, genes):
-        result = r.characteristic_direction(data, mask, genes)
-        genes = list(result.index.values)
-        values = result.to_numpy().tolist()
+    def run_custom_method(self, r, data, classes, genes):
+        # rows of the genes sorted by score, and their scores
+        result = np.asarray(self.r_function(data, classes))
+        rows = result[:, 0].astype(int) - 1
+        genes = [genes[row] for row in rows]
+        values = result[:, 1].tolist()
         return genes, values
@@ -2,6 +2,8 @@ from genebench.datatypes import GeneDiffInput
 from genebench.datatypes import GeneMethodResult
 from genebench.utils import Utils
 import importlib
+import hashlib
+import json
 
 
 class DiffMethodEntry:
@@ -31,6 +33,7 @@ class DiffMethodsManager:
         self.config = Utils.get_config(config_filename, "Methods")
         self.config = DiffMethodsManagerConfig(self.config)
         self.method_instances = {}
+        self.method_digests = {}
         self.module_names = []
 
     def register_diff_method(self, config):
@@ -62,6 +65,30 @@ class DiffMethodsManager:
             self.logger.info(f"Training {method_name} ..")
             instance.train()
     
+    def get_method_digest(self, method_name: str):
+        # hash of the method class, its config and the content of its
+        # model files, computed once per manager
+        if method_name not in self.method_digests:
+            method_entry = self.config.methods[method_name]
+            instance = self.method_instances[method_name]
+            sha = hashlib.sha1()
+            description = {'module_name': method_entry.module_name,
+                           'class_name': method_entry.class_name,
+                           'config': method_entry.config}
+            sha.update(json.dumps(description, sort_keys=True).encode())
+            for file_path in instance.get_model_files():
+                sha.update(Utils.file_digest(file_path).encode())
+            self.method_digests[method_name] = sha.hexdigest()
+        return self.method_digests[method_name]
+
+    def get_result_key(self, gene_input: GeneDiffInput, method_name: str):
+        # a stored result is valid only while both the method digest and
+        # the input digest are unchanged
+        sha = hashlib.sha1()
+        sha.update(self.get_method_digest(method_name).encode())
+        sha.update(gene_input.get_digest().encode())
+        return sha.hexdigest()
+
     def run(self, gene_input: GeneDiffInput, method_name: str):
         if method_name not in self.method_instances:
             self.logger.error(f"Method {method_name} not found!")
@@ -69,3 +96,11 @@ class DiffMethodsManager:
 
         instance = self.method_instances[method_name]
         return instance.run(gene_input)
+
+    def run_batch(self, gene_inputs, method_name: str):
+        if method_name not in self.method_instances:
+            self.logger.error(f"Method {method_name} not found!")
+            return [GeneMethodResult() for _ in gene_inputs]
+
+        instance = self.method_instances[method_name]
+        return instance.run_batch(gene_inputs)
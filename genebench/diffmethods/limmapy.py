@@ -0,0 +1,132 @@
+import numpy as np
+import scipy.special
+import scipy.stats
+from genebench.datatypes import GeneDiffInput, GeneMethodResult
+from genebench.diffmethods.base.diffmethod import DiffMethod
+from genebench.utils import Utils
+
+
+class LimmaPy(DiffMethod):
+    # limma's lmFit + eBayes + topTable(adjust="BH") on the two group
+    # design (~ class), computed for every gene at once without R
+
+    def setup(self, config):
+        self.logger = Utils.get_logger("LimmaPy")
+
+    def post_proces_results(self, genes, values):
+        values = np.ones(len(genes)) - values
+        return self.sort(genes, values)
+
+    def run(self, input: GeneDiffInput) -> GeneMethodResult:
+        p_values = self._moderated_pvalues(input.control, input.perturbed)
+        genes, values = self.post_proces_results(input.genes,
+                                                 self._bh_adjust(p_values))
+        return GeneMethodResult.from_separate_lists(genes, values)
+
+    def _moderated_pvalues(self, A, B):
+        coef, stdev_unscaled, s2, df_residual = self._lm_fit(A, B)
+        t, df_total = self._e_bayes(coef, stdev_unscaled, s2, df_residual)
+        return 2 * scipy.stats.t.sf(np.abs(t), df_total)
+
+    def _lm_fit(self, A, B):
+        # lmFit: with the design ~ class the group coefficient is the
+        # difference of the means and sigma^2 the pooled variance, every
+        # gene is fitted on its observed (finite) values like lm.series
+        A = np.asarray(A, dtype=np.float64)
+        B = np.asarray(B, dtype=np.float64)
+        observed_a = np.isfinite(A)
+        observed_b = np.isfinite(B)
+        n_a = observed_a.sum(axis=1)
+        n_b = observed_b.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_a = np.where(observed_a, A, 0).sum(axis=1) / n_a
+            mean_b = np.where(observed_b, B, 0).sum(axis=1) / n_b
+            residual_a = np.where(observed_a, A - mean_a[:, None], 0)
+            residual_b = np.where(observed_b, B - mean_b[:, None], 0)
+            ss = (residual_a ** 2).sum(axis=1) + (residual_b ** 2).sum(axis=1)
+            # a group without observations aliases the coefficient, the
+            # gene then has an intercept only fit
+            rank = (n_a > 0).astype(int) + (n_b > 0)
+            df_residual = n_a + n_b - rank
+            s2 = np.where(df_residual > 0, ss / df_residual, np.nan)
+            coef = mean_b - mean_a
+            stdev_unscaled = np.sqrt(1.0 / n_a + 1.0 / n_b)
+        if not np.any(df_residual > 0):
+            # limma's eBayes refuses these fits as well
+            message = (f"no residual degrees of freedom ({A.shape[1]} "
+                       f"control, {B.shape[1]} perturbed replicates)")
+            self.logger.error(message)
+            raise ValueError(message)
+        return coef, stdev_unscaled, s2, df_residual
+
+    def _e_bayes(self, coef, stdev_unscaled, s2, df_residual):
+        # eBayes: squeeze the gene variances towards the fitted prior,
+        # genes without residual df get the prior variance (squeezeVar)
+        if np.count_nonzero(df_residual > 0) < 2:
+            message = "at least 2 genes with a finite variance are needed"
+            self.logger.error(message)
+            raise ValueError(message)
+        s2 = np.where(df_residual > 0, s2, 0)
+        s2_prior, df_prior = self._fit_f_dist(s2, df_residual)
+        if np.isfinite(df_prior):
+            s2_post = ((df_residual * s2 + df_prior * s2_prior) /
+                       (df_residual + df_prior))
+        else:
+            s2_post = np.full_like(s2, s2_prior)
+        df_total = np.minimum(df_residual + df_prior, df_residual.sum())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = coef / stdev_unscaled / np.sqrt(s2_post)
+        return t, df_total
+
+    def _fit_f_dist(self, s2, df):
+        # moment estimation of the scaled F prior (limma fitFDist), the
+        # variances without residual df are left out
+        df = np.broadcast_to(df, np.shape(s2))
+        ok = np.isfinite(s2) & (df > 1e-15)
+        x = np.maximum(s2[ok], 0)
+        df = df[ok]
+        median = np.median(x)
+        if median == 0:
+            self.logger.warning('More than half of residual variances are '
+                                'exactly zero: eBayes unreliable')
+            median = 1
+        x = np.maximum(x, 1e-5 * median)
+        e = (np.log(x) - scipy.special.digamma(df / 2) + np.log(df / 2))
+        e_mean = e.mean()
+        e_var = (e.var(ddof=1) -
+                 np.mean(scipy.special.polygamma(1, df / 2)))
+        if e_var > 0:
+            df_prior = 2 * self._trigamma_inverse(e_var)
+            s2_prior = np.exp(e_mean + scipy.special.digamma(df_prior / 2) -
+                              np.log(df_prior / 2))
+        else:
+            df_prior = np.inf
+            s2_prior = np.exp(e_mean)
+        return s2_prior, df_prior
+
+    def _trigamma_inverse(self, x):
+        # Newton iteration of limma trigammaInverse
+        if x > 1e7:
+            return 1 / np.sqrt(x)
+        if x < 1e-6:
+            return 1 / x
+        y = 0.5 + 1 / x
+        for iteration in range(50):
+            tri = scipy.special.polygamma(1, y)
+            dif = tri * (1 - tri / x) / scipy.special.polygamma(2, y)
+            y = y + dif
+            if -dif / y < 1e-8:
+                break
+        else:
+            self.logger.warning('trigammaInverse iteration limit exceeded')
+        return y
+
+    def _bh_adjust(self, p_values):
+        # p.adjust(method="BH"), missing p values are left out of the count
+        adjusted = np.full_like(p_values, np.nan)
+        ok = np.flatnonzero(np.isfinite(p_values))
+        order = ok[np.argsort(p_values[ok])[::-1]]
+        rank = np.arange(len(order), 0, -1)
+        adjusted[order] = np.minimum(1, np.minimum.accumulate(
+            p_values[order] * len(order) / rank))
+        return adjusted
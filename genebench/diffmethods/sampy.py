@@ -0,0 +1,160 @@
+import itertools
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import scipy.stats
+from genebench.datatypes import GeneDiffInput, GeneMethodResult
+from genebench.diffmethods.base.samdiffmethod import SAMDiffMethod
+from genebench.utils import Utils
+
+
+class SAMPyConfig:
+    def __init__(self, config=None):
+        config = config or {}
+        # "wilcoxon" (as the R SAM method) or "standard" (t type)
+        self.test_statistic = config.get('test_statistic', 'wilcoxon')
+        # with a delta only the genes samr calls significant are kept,
+        # this needs the permutations
+        self.delta = config.get('delta', None)
+        self.nperms = config.get('nperms', 100)
+        self.seed = config.get('seed', None)
+        # permutations per matrix product and threads running them
+        self.perm_batch_size = config.get('perm_batch_size', 64)
+        self.workers = config.get('workers', 1)
+
+
+class SAMPy(SAMDiffMethod):
+    # samr's two class unpaired d statistic computed for all genes at once,
+    # every permutation of the class labels is a column of a label matrix
+    # so a batch of permutations is a single matrix product
+
+    def setup(self, config):
+        self.logger = Utils.get_logger("SAMPy")
+        self.config = SAMPyConfig(config)
+
+    def run(self, input: GeneDiffInput) -> GeneMethodResult:
+        genes = np.array(list(input.genes))
+        num_control = np.shape(input.control)[1]
+        X = self._get_matrix(input.control, input.perturbed)
+        perturbed = np.arange(X.shape[1]) >= num_control
+        numer, sd = self._statistic(X, perturbed[:, None])
+        numer, sd = numer[:, 0], sd[:, 0]
+        s0 = self._get_s0(numer, sd)
+        scores = numer / (sd + s0)
+        if self.config.delta is not None:
+            expected = self._expected_scores(X, num_control, s0)
+            keep = self._detect_slab(scores, expected, self.config.delta)
+            genes, scores = genes[keep], scores[keep]
+        genes, values = self.post_proces_results(genes, scores)
+        return GeneMethodResult.from_separate_lists(genes, values)
+
+    def _get_matrix(self, A, B):
+        # genes x samples matrix the statistic is computed on
+        X = np.concatenate((np.asarray(A, dtype=np.float64),
+                            np.asarray(B, dtype=np.float64)), axis=1)
+        if self.config.test_statistic == 'wilcoxon':
+            return scipy.stats.rankdata(X, axis=1)
+        # centered rows keep the sums of squares accurate
+        return X - X.mean(axis=1, keepdims=True)
+
+    def _statistic(self, X, perturbed):
+        # numerator and standard deviation of every gene (rows) for every
+        # labeling (columns of the samples x labelings perturbed mask)
+        in_b = perturbed.astype(np.float64)
+        in_a = 1.0 - in_b
+        n_a = in_a.sum(axis=0)
+        n_b = in_b.sum(axis=0)
+        if self.config.test_statistic == 'wilcoxon':
+            numer = X @ in_b - n_b * (n_b + 1) / 2 - n_a * n_b / 2
+            sd = np.sqrt(n_a * n_b * (n_a + n_b + 1) / 12)
+            return numer, np.broadcast_to(sd, numer.shape)
+        sum_a = X @ in_a
+        sum_b = X @ in_b
+        squares = X * X
+        ss = (squares @ in_a - sum_a * sum_a / n_a +
+              squares @ in_b - sum_b * sum_b / n_b)
+        sd = np.sqrt(np.maximum(ss, 0) * (1 / n_a + 1 / n_b) /
+                     (n_a + n_b - 2))
+        return sum_b / n_b - sum_a / n_a, sd
+
+    def _get_s0(self, numer, sd):
+        if self.config.test_statistic == 'wilcoxon':
+            return np.quantile(sd, 0.05)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._estimate_s0(numer / sd, sd)
+
+    def _estimate_s0(self, tt, sd):
+        # samr est.s0: the sd percentile that makes the spread (mad) of the
+        # scores most even across 100 sd bins
+        percentiles = np.linspace(0, 1, 21)
+        breaks = np.unique(np.quantile(sd, np.linspace(0, 1, 101)))
+        if len(breaks) < 3:
+            return np.quantile(sd, 0.05)
+        bins = np.maximum(np.searchsorted(breaks, sd, side='left'), 1)
+        cv_sd = np.full(len(percentiles), np.nan)
+        for index, percentile in enumerate(percentiles):
+            w = np.quantile(sd, percentile) if index > 0 else 0
+            tt2 = tt * sd / (sd + w)
+            tt2[np.isinf(tt2)] = np.nan
+            sds = np.array([self._mad(tt2[bins == bin])
+                            for bin in range(1, len(breaks))])
+            cv_sd[index] = np.std(sds, ddof=1) / np.mean(sds)
+        best = percentiles[np.nanargmin(cv_sd)]
+        return np.quantile(sd[sd != 0], best)
+
+    @staticmethod
+    def _mad(x):
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            return np.nan
+        return 1.4826 * np.median(np.abs(x - np.median(x)))
+
+    def _get_permutations(self, num_samples, num_control):
+        # samples x permutations mask of the perturbed samples, all the
+        # labelings when there are at most nperms of them
+        num_perturbed = num_samples - num_control
+        if math.comb(num_samples, num_perturbed) <= self.config.nperms:
+            chosen = np.array(list(itertools.combinations(
+                range(num_samples), num_perturbed)))
+        else:
+            rng = np.random.default_rng(self.config.seed)
+            chosen = np.argsort(rng.random((self.config.nperms,
+                                            num_samples)),
+                                axis=1)[:, :num_perturbed]
+        perturbed = np.zeros((num_samples, len(chosen)), dtype=bool)
+        np.put_along_axis(perturbed.T, chosen, True, axis=1)
+        return perturbed
+
+    def _expected_scores(self, X, num_control, s0):
+        # expected order statistics (samr evo): mean of the sorted scores
+        # of every permutation, batches run in parallel (numpy releases
+        # the GIL) and the labels are drawn up front so a seed gives the
+        # same result with any number of workers
+        perturbed = self._get_permutations(X.shape[1], num_control)
+        num_batches = math.ceil(perturbed.shape[1] /
+                                max(self.config.perm_batch_size, 1))
+        batches = np.array_split(perturbed, num_batches, axis=1)
+
+        def sorted_scores_sum(batch):
+            numer, sd = self._statistic(X, batch)
+            return np.sort(numer / (sd + s0), axis=0).sum(axis=1)
+
+        with ThreadPoolExecutor(max(self.config.workers, 1)) as pool:
+            total = sum(pool.map(sorted_scores_sum, batches))
+        return total / perturbed.shape[1]
+
+    def _detect_slab(self, scores, expected, delta):
+        # samr detec.slab: going out from the middle, the genes from the
+        # first one whose score is delta away from its expected score on
+        order = np.argsort(scores)
+        difference = scores[order] - expected
+        keep = []
+        up = np.flatnonzero((difference > delta) & (expected > 0))
+        if len(up) > 0:
+            keep.append(order[up[0]:])
+        low = np.flatnonzero((-difference > delta) & (expected < 0))
+        if len(low) > 0:
+            keep.append(order[:low[-1] + 1])
+        if not keep:
+            return np.array([], dtype=int)
+        return np.concatenate(keep)
@@ -1,5 +1,4 @@
 import scipy.stats
-from numpy import array, empty
 import numpy as np
 from genebench.datatypes import GeneDiffInput, GeneMethodResult
 from genebench.diffmethods.base.diffmethod import DiffMethod
@@ -10,50 +9,76 @@ class TTest(DiffMethod):
         genes, pvalues = self._get_pvalues(input.control,
                                            input.perturbed,
                                            input.genes)
-        pvalues = self._correct_pvalues(pvalues)
-        values = np.ones(len(genes)) - pvalues
+        return self._get_result(genes, self._correct_pvalues(pvalues))
+
+    def run_batch(self, inputs) -> list:
+        # experiments with the same shape are stacked and tested together
+        results = [None] * len(inputs)
+        groups = {}
+        for index, input in enumerate(inputs):
+            shape = (np.shape(input.control), np.shape(input.perturbed))
+            groups.setdefault(shape, []).append(index)
+        for indices in groups.values():
+            A = np.stack([inputs[index].control for index in indices])
+            B = np.stack([inputs[index].perturbed for index in indices])
+            qvalues = self._correct_pvalues(self._welch_pvalues(A, B))
+            for index, input_qvalues in zip(indices, qvalues):
+                results[index] = self._get_result(inputs[index].genes,
+                                                  input_qvalues)
+        return results
+
+    def _get_result(self, genes, qvalues):
+        values = np.ones(len(genes)) - qvalues
         values = np.where(values >= 0.95, values, np.clip(values - 0.5, 0, 1))
         genes, values = self.sort(genes, values)
         return GeneMethodResult.from_separate_lists(genes, values)
 
     def _get_pvalues(self, A, B, genes):
-        pvalues = []
-        for i in range(len(A)):
-            # equal_var=False specifies to use Welch's t-test.
-            ttest_results = scipy.stats.ttest_ind(A[i], B[i], equal_var=False)
-            pvalue = ttest_results.pvalue
-            pvalues.append(pvalue)
+        return genes, self._welch_pvalues(A, B)
 
-        return genes, pvalues
+    @staticmethod
+    def _welch_pvalues(A, B):
+        # Welch's t-test of every gene (row) in one pass, A and B are
+        # (..., genes, replicates) so a stack of experiments works too
+        A = np.asarray(A, dtype=np.float64)
+        B = np.asarray(B, dtype=np.float64)
+        n_a = A.shape[-1]
+        n_b = B.shape[-1]
+        se_a = A.var(axis=-1, ddof=1) / n_a
+        se_b = B.var(axis=-1, ddof=1) / n_b
+        difference = A.mean(axis=-1) - B.mean(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = difference / np.sqrt(se_a + se_b)
+            df = (se_a + se_b) ** 2 / (se_a ** 2 / (n_a - 1) +
+                                       se_b ** 2 / (n_b - 1))
+            pvalues = 2 * scipy.stats.t.sf(np.abs(t), df)
+        # genes constant within both groups: as scipy's ttest_ind, p is 0
+        # when the group means differ and nan only when they are equal
+        constant = (se_a + se_b) == 0
+        return np.where(constant & (difference != 0), 0.0, pvalues)
 
     def _correct_pvalues(self, pvalues, correction_type="FDR"):
-        pvalues = array(pvalues)
-        sample_size = pvalues.shape[0]
-        qvalues = empty(sample_size)
+        # corrects along the last axis, so a stack of experiments is
+        # corrected at once, nan p values stay nan
+        pvalues = np.asarray(pvalues, dtype=np.float64)
+        sample_size = pvalues.shape[-1]
         if correction_type == "Bonferroni":
-            # Bonferroni correction
-            qvalues = sample_size * pvalues
-        elif correction_type == "Bonferroni-Holm":
-            # Bonferroni-Holm correction
-            values = [(pvalue, i) for i, pvalue in enumerate(pvalues)]
-            values.sort()
-            for rank, vals in enumerate(values):
-                pvalue, i = vals
-                qvalues[i] = (sample_size-rank) * pvalue
+            return sample_size * pvalues
+        order = np.argsort(pvalues, axis=-1)
+        sorted_pvalues = np.take_along_axis(pvalues, order, axis=-1)
+        rank = np.arange(1, sample_size + 1)
+        if correction_type == "Bonferroni-Holm":
+            # step down: a q value is never below the ones ranked before
+            sorted_qvalues = np.fmax.accumulate(
+                (sample_size - rank + 1) * sorted_pvalues, axis=-1)
         elif correction_type == "FDR":
-            # Benjamini-Hochberg, AKA - FDR test
-            values = [(pvalue, i) for i, pvalue in enumerate(pvalues)]
-            values.sort()
-            values.reverse()
-            new_values = []
-            for i, vals in enumerate(values):
-                rank = sample_size - i
-                pvalue, index = vals
-                new_values.append((sample_size/rank) * pvalue)
-            for i in range(0, int(sample_size)-1):
-                if new_values[i] < new_values[i+1]:
-                    new_values[i+1] = new_values[i]
-            for i, vals in enumerate(values):
-                pvalue, index = vals
-                qvalues[index] = new_values[i]
+            # Benjamini-Hochberg, AKA - FDR test: cumulative minimum from
+            # the largest p value down
+            sorted_qvalues = sorted_pvalues * sample_size / rank
+            sorted_qvalues = np.fmin.accumulate(
+                sorted_qvalues[..., ::-1], axis=-1)[..., ::-1]
+        else:
+            return pvalues
+        qvalues = np.empty_like(sorted_qvalues)
+        np.put_along_axis(qvalues, order, sorted_qvalues, axis=-1)
         return qvalues
@@ -1,4 +1,8 @@
+import os
+import numpy as np
+from genebench.utils import Utils
 from genebench.datatypes import GeneDiffValidation, GeneMethodResult
+from genebench.datatypes import GeneVocabulary
 
 
 class Metric():
@@ -13,5 +17,77 @@ class Metric():
 
         pass
 
-    def evaluate(self, group_name):
+    def evaluate(self, group_name, plots=True):
+        # serial evaluation, the metric manager runs the same steps in
+        # parallel when it has workers
+        tasks = self.get_tasks()
+        if tasks is None:
+            return
+        summaries = {}
+        for validation_source, method_name, data in tasks:
+            summary = self.compute(data)
+            summaries.setdefault(validation_source, []).append(
+                (method_name, summary))
+        self.reset()
+        for validation_source, method_summaries in summaries.items():
+            self.write_report(group_name, validation_source, method_summaries)
+            if plots:
+                self.plot(self.get_output_path(group_name, validation_source,
+                                               "png"),
+                          f"{group_name}_{validation_source}",
+                          method_summaries)
+
+    def get_tasks(self):
+        # (validation_source, method_name, data) for every accumulated
+        # method, data is what compute needs. None for metrics that only
+        # implement evaluate
+        return None
+
+    @staticmethod
+    def compute(data):
+        # numeric evaluation of one (validation source, method) pair, runs
+        # in worker processes so it only gets and returns plain data
+        return None
+
+    @staticmethod
+    def plot(path, title, method_summaries):
+        pass
+
+    def write_report(self, group_name, validation_source, method_summaries):
+        pass
+
+    def reset(self):
         pass
+
+    def get_state(self, method_name=None):
+        # picklable accumulated data used to resume a run (only the data of
+        # method_name when given), None when the metric can not be resumed
+        return None
+
+    def set_state(self, state):
+        # merges a saved state into the accumulated data
+        pass
+
+    def get_output_path(self, group_name, validation_source, extension):
+        Utils.create_folder_if_not_exist(self.output_folder)
+        save_path = os.path.join(self.output_folder, self.name)
+        Utils.create_folder_if_not_exist(save_path)
+        return os.path.join(save_path,
+                            f"{group_name}_{validation_source}.{extension}")
+
+    def write_lines(self, path, lines):
+        with open(path, mode='wt', encoding='utf-8') as out_scores:
+            out_scores.write('\n'.join(lines))
+
+    def get_valid_mask(self,
+                       pf,
+                       validation: GeneDiffValidation,
+                       result: GeneMethodResult):
+        # marks the ranked result genes that are in the validation set,
+        # done on vocabulary ids instead of lower cased gene names
+        vocabulary = validation.vocabulary or result.vocabulary
+        if vocabulary is None:
+            vocabulary = GeneVocabulary()
+        valid_ids = validation.get_gene_ids(pf, vocabulary)
+        result_ids = result.get_gene_ids(vocabulary)
+        return np.isin(result_ids, valid_ids)
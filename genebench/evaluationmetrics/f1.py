@@ -5,7 +5,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import uniform
 from sklearn.metrics import f1_score
-import os
 
 
 class F1(Metric):
@@ -32,49 +31,55 @@ class F1(Metric):
         self.logger.info(f"perturbation factor: {pf}")
         # we collect all results
         if method_name not in method_f1:
-            method_f1[method_name] = {'y': [], 'pred': []}
+            method_f1[method_name] = {'y': [np.array([], dtype=int)],
+                                      'pred': [np.array([], dtype=int)]}
 
-        result_data = result.result
         valid_data = validation.data
         if pf not in valid_data:
             self.logger.error(f"{pf} not found in set {validation.source}")
             return
 
-        genes = valid_data[pf]
-        valid_genes = set([x.lower() for x in genes])
-        real_class = []
-        pred = []
-        for gene_entry in result_data:
-            gene_name = gene_entry.gene_name.lower()
-            if gene_name in valid_genes:
-                real_class.append(1)
-            else:
-                real_class.append(0)
-            if gene_entry.score >= 0.5:
-                pred.append(1)
-            else:
-                pred.append(0)
-        method_f1[method_name]['y'].extend(real_class)
-        method_f1[method_name]['pred'].extend(pred)
+        real_class = self.get_valid_mask(pf, validation, result)
+        pred = result.scores >= 0.5
+        method_f1[method_name]['y'].append(real_class.astype(int))
+        method_f1[method_name]['pred'].append(pred.astype(int))
 
-    def evaluate(self, group_name):
-        Utils.create_folder_if_not_exist(self.output_folder)
-        save_path = os.path.join(self.output_folder, self.name)
-        Utils.create_folder_if_not_exist(save_path)
-
-        for validation_source in self.method_f1.keys():
-            method_f1 = self.method_f1[validation_source]
-            methods = []
+    def get_tasks(self):
+        tasks = []
+        for validation_source, method_f1 in self.method_f1.items():
             for method_name, _f1 in method_f1.items():
-                pred = _f1['pred']
-                pred = np.nan_to_num(pred, True, 0.0, 1.0, 0.0)
-                f1 = f1_score(_f1['y'], pred)
-                methods.append(f"{method_name} F1 Score: {f1:.4f}")
-            name = f"{group_name}_{validation_source}"
-            path_file = f"{name}.txt"
-            path_method = os.path.join(save_path,
-                                       path_file)
-            with open(path_method, mode='wt', encoding='utf-8') as out_scores:
-                out_scores.write('\n'.join(methods))
+                tasks.append((validation_source, method_name,
+                              {'y': np.concatenate(_f1['y']),
+                               'pred': np.concatenate(_f1['pred'])}))
+        return tasks
+
+    @staticmethod
+    def compute(data):
+        pred = np.nan_to_num(data['pred'], True, 0.0, 1.0, 0.0)
+        return {'f1': f1_score(data['y'], pred)}
+
+    def write_report(self, group_name, validation_source, method_summaries):
+        methods = [f"{method_name} F1 Score: {summary['f1']:.4f}"
+                   for method_name, summary in method_summaries]
+        self.write_lines(self.get_output_path(group_name,
+                                              validation_source,
+                                              "txt"),
+                         methods)
+
+    def reset(self):
         self.method_f1 = {}
         self.logger.info("done")
+
+    def get_state(self, method_name=None):
+        state = {}
+        for validation_source, methods in self.method_f1.items():
+            state[validation_source] = {
+                name: {key: [np.concatenate(values)]
+                       for key, values in data.items()}
+                for name, data in methods.items()
+                if method_name is None or name == method_name}
+        return state
+
+    def set_state(self, state):
+        for validation_source, methods in state.items():
+            self.method_f1.setdefault(validation_source, {}).update(methods)
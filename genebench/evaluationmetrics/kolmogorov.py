@@ -4,7 +4,6 @@ from genebench.utils import Utils
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import uniform
-import os
 
 
 class Kolmogorov(Metric):
@@ -17,15 +16,6 @@ class Kolmogorov(Metric):
         self.output_folder = output_folder
         pass
 
-    def plot_cdf(self, data):
-        x, y = Utils.ecdf(data)
-        x = np.append(x, [1.0])
-        y = np.append(y, [1.0])
-        y = y - uniform.cdf(x)
-        plt.plot(x, y)
-        plt.xlabel('rank', fontsize=16)
-        plt.ylabel('cdf(r)-r', fontsize=16)
-
     def add(self,
             pf,
             method_name,
@@ -40,48 +30,69 @@ class Kolmogorov(Metric):
         self.logger.info(f"perturbation factor: {pf}")
         # we collect all results
         if method_name not in method_rks:
-            method_rks[method_name] = []
+            method_rks[method_name] = [np.array([])]
 
-        result_data = result.result
         valid_data = validation.data
         if pf not in valid_data:
             self.logger.error(f"{pf} not found in set {validation.source}")
             return
 
-        genes = valid_data[pf]
-        valid_genes = set([x.lower() for x in genes])
+        valid_mask = self.get_valid_mask(pf, validation, result)
+        number_of_genes = len(valid_mask)
+        rks = np.nonzero(valid_mask)[0] / number_of_genes
+        method_rks[method_name].append(rks)
 
-        rks = []
-        number_of_genes = len(result_data)
-        for index, gene_entry in enumerate(result_data):
-            gene_name = gene_entry.gene_name.lower()
-            if gene_name in valid_genes:
-                rank = index / number_of_genes
-                rks.append(rank)
+    def get_tasks(self):
+        tasks = []
+        for validation_source, method_rks in self.method_rks.items():
+            for method_name, rks in method_rks.items():
+                tasks.append((validation_source, method_name,
+                              np.concatenate(rks)))
+        return tasks
 
-        method_rks[method_name].extend(rks)
+    @staticmethod
+    def compute(data):
+        # deviation of the validated gene rank cdf from the uniform cdf,
+        # its largest absolute value is the kolmogorov statistic
+        x, y = Utils.ecdf(data)
+        x = np.append(x, [1.0])
+        y = np.append(y, [1.0])
+        y = y - uniform.cdf(x)
+        return {'x': x, 'y': y, 'statistic': float(np.max(np.abs(y)))}
 
-    def evaluate(self, group_name):
+    @staticmethod
+    def plot(path, title, method_summaries):
         fig = plt.figure()
-        Utils.create_folder_if_not_exist(self.output_folder)
-        save_path = os.path.join(self.output_folder, self.name)
-        Utils.create_folder_if_not_exist(save_path)
+        for _, summary in method_summaries:
+            plt.plot(summary['x'], summary['y'])
+        plt.xlabel('rank', fontsize=16)
+        plt.ylabel('cdf(r)-r', fontsize=16)
+        plt.legend([method_name for method_name, _ in method_summaries])
+        plt.title(title)
+        plt.savefig(path)
+        plt.close(fig)
 
-        for validation_source in self.method_rks.keys():
-            method_rks = self.method_rks[validation_source]
-            methods = []
-            for method_name, rks in method_rks.items():
-                rks_array = np.sort(np.array(rks))
-                self.plot_cdf(rks_array)
-                methods.append(method_name)
-            name = f"{group_name}_{validation_source}"
-            path_file = f"{name}.png"
-            path_method = os.path.join(save_path,
-                                       path_file)
-            plt.legend(methods)
-            plt.savefig(path_method)
-            plt.title(f"{name}")
-            plt.clf()
-            fig.clf()
+    def write_report(self, group_name, validation_source, method_summaries):
+        methods = [f"{method_name} KS {summary['statistic']:.4f}"
+                   for method_name, summary in method_summaries]
+        self.write_lines(self.get_output_path(group_name,
+                                              validation_source,
+                                              "txt"),
+                         methods)
+
+    def reset(self):
         self.method_rks = {}
         self.logger.info("done")
+
+    def get_state(self, method_name=None):
+        state = {}
+        for validation_source, methods in self.method_rks.items():
+            state[validation_source] = {
+                name: [np.concatenate(rks)]
+                for name, rks in methods.items()
+                if method_name is None or name == method_name}
+        return state
+
+    def set_state(self, state):
+        for validation_source, methods in state.items():
+            self.method_rks.setdefault(validation_source, {}).update(methods)
@@ -3,6 +3,8 @@ from genebench.datatypes import GeoData
 from genebench.datatypes import GeneDiffValidation
 from genebench.utils import Utils
 import importlib
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
 
 
 class MetricEntry:
@@ -22,6 +24,10 @@ class MetricManagerConfig:
     def __init__(self, dict):
         self.metrics = []
         self.output_folder = dict['output_folder']
+        # workers > 0 computes the metrics and renders the plots in that
+        # many processes, plots can be turned off completely
+        self.workers = dict.get('workers', 0)
+        self.plots = dict.get('plots', True)
         for _, config_item in dict['metrics'].items():
             self.metrics.append(MetricEntry(**config_item))
 
@@ -34,6 +40,7 @@ class MetricManager:
         self.config = MetricManagerConfig(self.config)
         self.metric_instances = {}
         self.module_names = []
+        self.executor = None
 
     def register_metric_method(self, config):
         self.config.metrics.append(MetricEntry(**config))
@@ -61,6 +68,72 @@ class MetricManager:
                          valid,
                          res)
 
+    def submit(self, function, *args):
+        if self.config.workers <= 0:
+            future = Future()
+            future.set_result(function(*args))
+            return future
+        if self.executor is None:
+            context = multiprocessing.get_context('spawn')
+            self.executor = ProcessPoolExecutor(self.config.workers,
+                                                mp_context=context)
+        return self.executor.submit(function, *args)
+
     def evaluate(self, group_name):
-        for _, instance in self.metric_instances.items():
-            instance.evaluate(group_name)
+        # one compute task per (metric, validation source, method), the
+        # reports are written here and the plots rendered by the workers
+        computed = []
+        for name, instance in self.metric_instances.items():
+            tasks = instance.get_tasks()
+            if tasks is None:
+                instance.evaluate(group_name)
+                continue
+            for validation_source, method_name, data in tasks:
+                future = self.submit(instance.compute, data)
+                computed.append((name, validation_source, method_name,
+                                 future))
+            instance.reset()
+
+        summaries = {}
+        for name, validation_source, method_name, future in computed:
+            metric_summaries = summaries.setdefault(name, {})
+            metric_summaries.setdefault(validation_source, []).append(
+                (method_name, future.result()))
+
+        plots = []
+        for name, metric_summaries in summaries.items():
+            instance = self.metric_instances[name]
+            for validation_source, method_summaries in \
+                    metric_summaries.items():
+                instance.write_report(group_name,
+                                      validation_source,
+                                      method_summaries)
+                if not self.config.plots:
+                    continue
+                path = instance.get_output_path(group_name,
+                                                validation_source,
+                                                "png")
+                plots.append(self.submit(instance.plot,
+                                         path,
+                                         f"{group_name}_{validation_source}",
+                                         method_summaries))
+        for future in plots:
+            future.result()
+
+    def get_state(self, method_name=None):
+        state = {}
+        for name, instance in self.metric_instances.items():
+            state[name] = instance.get_state(method_name)
+            if state[name] is None:
+                return None
+        return state
+
+    def set_state(self, state):
+        for name, instance in self.metric_instances.items():
+            if name in state:
+                instance.set_state(state[name])
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
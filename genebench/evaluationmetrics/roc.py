@@ -5,7 +5,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import uniform
 from sklearn.metrics import roc_curve, roc_auc_score
-import os
 
 
 class ROC(Metric):
@@ -32,55 +31,72 @@ class ROC(Metric):
         self.logger.info(f"perturbation factor: {pf}")
         # we collect all results
         if method_name not in method_roc:
-            method_roc[method_name] = {'y': [], 'pred': []}
+            method_roc[method_name] = {'y': [np.array([], dtype=int)],
+                                       'pred': [np.array([])]}
 
-        result_data = result.result
         valid_data = validation.data
         if pf not in valid_data:
             self.logger.error(f"{pf} not found in set {validation.source}")
             return
 
-        genes = valid_data[pf]
-        valid_genes = set([x.lower() for x in genes])
-        real_class = []
-        pred = []
-        for gene_entry in result_data:
-            gene_name = gene_entry.gene_name.lower()
-            if gene_name in valid_genes:
-                real_class.append(1)
-            else:
-                real_class.append(0)
-            pred.append(gene_entry.score)
-        method_roc[method_name]['y'].extend(real_class)
-        method_roc[method_name]['pred'].extend(pred)
+        real_class = self.get_valid_mask(pf, validation, result)
+        method_roc[method_name]['y'].append(real_class.astype(int))
+        method_roc[method_name]['pred'].append(result.scores)
 
-    def evaluate(self, group_name):
+    def get_tasks(self):
+        tasks = []
+        for validation_source, method_roc in self.method_roc.items():
+            for method_name, roc in method_roc.items():
+                tasks.append((validation_source, method_name,
+                              {'y': np.concatenate(roc['y']),
+                               'pred': np.concatenate(roc['pred'])}))
+        return tasks
+
+    @staticmethod
+    def compute(data):
+        y = data['y']
+        pred = np.nan_to_num(data['pred'], True, 0.0, 1.0, 0.0)
+        fpr, tpr, _ = roc_curve(y, pred)
+        return {'auc': roc_auc_score(y, pred), 'fpr': fpr, 'tpr': tpr}
+
+    @staticmethod
+    def plot(path, title, method_summaries):
         fig = plt.figure()
-        Utils.create_folder_if_not_exist(self.output_folder)
-        save_path = os.path.join(self.output_folder, self.name)
-        Utils.create_folder_if_not_exist(save_path)
+        methods = []
+        for method_name, summary in method_summaries:
+            fpr = summary['fpr']
+            tpr = summary['tpr'] - uniform.cdf(fpr)
+            plt.plot(fpr, tpr)
+            methods.append(f"{method_name} AUC {summary['auc']:.4f}")
+        plt.xlabel('False Positive Rate', fontsize=16)
+        plt.ylabel('True Positive Rate', fontsize=16)
+        plt.legend(methods)
+        plt.title(title)
+        plt.savefig(path)
+        plt.close(fig)
 
-        for validation_source in self.method_roc.keys():
-            method_roc = self.method_roc[validation_source]
-            methods = []
-            for method_name, roc in method_roc.items():
-                pred = roc['pred']
-                pred = np.nan_to_num(pred, True, 0.0, 1.0, 0.0)
-                fpr, tpr, _ = roc_curve(roc['y'], pred)
-                score = roc_auc_score(roc['y'], pred)
-                tpr = tpr - uniform.cdf(fpr)
-                plt.plot(fpr, tpr)
-                plt.xlabel('False Positive Rate', fontsize=16)
-                plt.ylabel('True Positive Rate', fontsize=16)
-                methods.append(f"{method_name} AUC {score:.4f}")
-            name = f"{group_name}_{validation_source}"
-            path_file = f"{name}.png"
-            path_method = os.path.join(save_path,
-                                       path_file)
-            plt.legend(methods)
-            plt.savefig(path_method)
-            plt.title(f"{name}")
-            plt.clf()
-            fig.clf()
+    def write_report(self, group_name, validation_source, method_summaries):
+        methods = [f"{method_name} AUC {summary['auc']:.4f}"
+                   for method_name, summary in method_summaries]
+        self.write_lines(self.get_output_path(group_name,
+                                              validation_source,
+                                              "txt"),
+                         methods)
+
+    def reset(self):
         self.method_roc = {}
         self.logger.info("done")
+
+    def get_state(self, method_name=None):
+        state = {}
+        for validation_source, methods in self.method_roc.items():
+            state[validation_source] = {
+                name: {key: [np.concatenate(values)]
+                       for key, values in data.items()}
+                for name, data in methods.items()
+                if method_name is None or name == method_name}
+        return state
+
+    def set_state(self, state):
+        for validation_source, methods in state.items():
+            self.method_roc.setdefault(validation_source, {}).update(methods)
@@ -45,7 +45,6 @@ class GenerateSilicoData():
         self.logger.info("storing experiments data")
         for id, provider in enumerate(providers):
             self.logger.info(f"silico provider: {id+1}/{len(providers)}")
-            for id, experiment in enumerate(provider):
-                self.logger.info(f"silico experiment {id+1}/{len(provider)}")
-                self.store.insert_geo(experiment)
+            self.logger.info(f"silico experiments: {len(provider)}")
+            self.store.insert_many_geo(provider)
         self.logger.info("done")
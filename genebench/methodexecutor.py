@@ -0,0 +1,326 @@
+import os
+import time
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from concurrent.futures import Future, ProcessPoolExecutor
+from genebench.diffmethods.diffmethodsmanager import DiffMethodsManager
+from genebench.profiler import Profiler
+from genebench.utils import Utils
+
+
+class MethodTaskFailure(Exception):
+    # a method run that did not produce a result, reason is one of
+    # "error", "timeout", "memory" or "crashed"
+    def __init__(self, reason, message, seconds=None):
+        super().__init__(f"{reason}: {message}")
+        self.reason = reason
+        self.message = message
+        self.seconds = seconds
+
+    def to_dict(self):
+        return {'reason': self.reason,
+                'message': self.message,
+                'seconds': self.seconds}
+
+
+class MethodWorker:
+    # state of a worker process, R and tensorflow are not fork safe so
+    # every worker is spawned and sets up its own methods manager
+    manager = None
+
+    @staticmethod
+    def setup(config_filename):
+        MethodWorker.manager = DiffMethodsManager(config_filename)
+        MethodWorker.manager.setup()
+
+    @staticmethod
+    def run_timed(manager, gene_inputs, method_name: str,
+                  profile_path=None):
+        # (results, seconds spent in the method on the whole batch, stages
+        # measured in the process that ran it)
+        results, stages = Profiler.run_task(
+            lambda: manager.run_batch(gene_inputs, method_name),
+            profile_path)
+        return results, stages[0]['wall'], stages
+
+    @staticmethod
+    def run(gene_inputs, method_name: str, profile_path=None):
+        return MethodWorker.run_timed(MethodWorker.manager, gene_inputs,
+                                      method_name, profile_path)
+
+    @staticmethod
+    def get_method_digests():
+        manager = MethodWorker.manager
+        return {method_name: manager.get_method_digest(method_name)
+                for method_name in manager.method_instances}
+
+
+class SerialMethodExecutor:
+    # runs the methods in the calling process, submit takes a batch of
+    # inputs and returns an already finished future of (results, seconds,
+    # stages)
+    def __init__(self, method_manager: DiffMethodsManager):
+        self.method_manager = method_manager
+        self.workers = 1
+
+    def submit(self, gene_inputs, method_name: str, profile_path=None):
+        future = Future()
+        try:
+            future.set_result(MethodWorker.run_timed(self.method_manager,
+                                                     gene_inputs,
+                                                     method_name,
+                                                     profile_path))
+        except Exception as ex:
+            future.set_exception(ex)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class ProcessMethodExecutor:
+    def __init__(self, config_filename, workers):
+        self.workers = workers
+        context = multiprocessing.get_context('spawn')
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=context,
+                                            initializer=MethodWorker.setup,
+                                            initargs=(config_filename,))
+
+    def submit(self, gene_inputs, method_name: str, profile_path=None):
+        return self.executor.submit(MethodWorker.run, gene_inputs,
+                                    method_name, profile_path)
+
+    def get_method_digests(self):
+        # the parent process does not set up the methods, the digests of
+        # their configs and model files are computed by a worker
+        return self.executor.submit(MethodWorker.get_method_digests).result()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+class SupervisedWorker:
+    # a spawned process running one task at a time, the supervisor can
+    # kill it at any moment and start a new one in its place
+    def __init__(self, context, config_filename):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=SupervisedWorker.main,
+                                       args=(child_connection,
+                                             config_filename),
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.is_ready = False
+        self.task = None
+        self.start_time = None
+
+    @staticmethod
+    def main(connection, config_filename):
+        MethodWorker.setup(config_filename)
+        connection.send(('ready', None))
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            kind, args = message
+            try:
+                if kind == 'digests':
+                    output = MethodWorker.get_method_digests()
+                else:
+                    output = MethodWorker.run(*args)
+                connection.send(('ok', output))
+            except Exception as ex:
+                connection.send(('error', f"{type(ex).__name__}: {ex}\n"
+                                          f"{traceback.format_exc()}"))
+
+    def send(self, task):
+        self.task = task
+        self.start_time = time.perf_counter()
+        self.connection.send((task[0], task[1]))
+
+    def get_elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def get_rss(self):
+        # resident memory in bytes from /proc, None when not available
+        try:
+            with open(f"/proc/{self.process.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            return None
+        return None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class SupervisedMethodExecutor:
+    # like ProcessMethodExecutor but every method run is watched: a run
+    # longer than timeout seconds per input or a worker using more than
+    # max_memory bytes is killed and its future fails with a
+    # MethodTaskFailure
+    def __init__(self, config_filename, workers, timeout=None,
+                 max_memory=None, poll_interval=0.5):
+        self.logger = Utils.get_logger("SupervisedMethodExecutor")
+        self.config_filename = config_filename
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.poll_interval = poll_interval
+        if max_memory and not os.path.isdir("/proc"):
+            self.logger.warning("no /proc, memory limit is not enforced")
+        self.context = multiprocessing.get_context('spawn')
+        self.lock = threading.Lock()
+        self.queue = deque()
+        self.running = True
+        self.broken_message = None
+        self.worker_list = [SupervisedWorker(self.context, config_filename)
+                            for _ in range(self.workers)]
+        self.supervisor = threading.Thread(target=self.__supervise,
+                                           daemon=True)
+        self.supervisor.start()
+
+    def __submit(self, kind, args, description):
+        future = Future()
+        with self.lock:
+            if self.broken_message is not None:
+                future.set_exception(MethodTaskFailure(
+                    "crashed", self.broken_message))
+                return future
+            self.queue.append((kind, args, description, future))
+        return future
+
+    def submit(self, gene_inputs, method_name: str, profile_path=None):
+        return self.__submit('run', (gene_inputs, method_name, profile_path),
+                             method_name)
+
+    def get_method_digests(self):
+        return self.__submit('digests', (), 'digests').result()
+
+    def __fail(self, worker, reason, message):
+        _, _, description, future = worker.task
+        seconds = worker.get_elapsed()
+        self.logger.error(f"{description} failed ({reason}) after "
+                          f"{seconds:.1f}s: {message}")
+        future.set_exception(MethodTaskFailure(reason, message, seconds))
+        worker.task = None
+
+    def __replace(self, worker):
+        worker.kill()
+        index = self.worker_list.index(worker)
+        self.worker_list[index] = SupervisedWorker(self.context,
+                                                   self.config_filename)
+
+    def __receive(self, worker):
+        try:
+            status, output = worker.connection.recv()
+        except (EOFError, OSError):
+            worker.process.join()
+            exit_code = worker.process.exitcode
+            if not worker.is_ready:
+                # the methods could not be set up, a new worker would
+                # fail the same way
+                self.__set_broken(f"worker setup failed with code "
+                                  f"{exit_code}")
+                self.worker_list.remove(worker)
+                return
+            if worker.task is not None:
+                self.__fail(worker, "crashed",
+                            f"worker exited with code {exit_code}")
+            self.__replace(worker)
+            return
+        if status == 'ready':
+            worker.is_ready = True
+            return
+        _, _, _, future = worker.task
+        worker.task = None
+        if status == 'ok':
+            future.set_result(output)
+        else:
+            future.set_exception(MethodTaskFailure("error", output))
+
+    def __set_broken(self, message):
+        self.logger.error(message)
+        with self.lock:
+            self.broken_message = message
+            tasks = list(self.queue)
+            self.queue.clear()
+        for _, _, _, future in tasks:
+            future.set_exception(MethodTaskFailure("crashed", message))
+
+    def __check_limits(self, worker):
+        if worker.task is None:
+            return
+        kind, args, _, _ = worker.task
+        timeout = self.timeout
+        if timeout and kind == 'run':
+            # the timeout is per input of the batch
+            timeout *= len(args[0])
+        if timeout and worker.get_elapsed() > timeout:
+            self.__fail(worker, "timeout", f"no result after {timeout}s")
+            self.__replace(worker)
+            return
+        if self.max_memory:
+            rss = worker.get_rss()
+            if rss is not None and rss > self.max_memory:
+                self.__fail(worker, "memory",
+                            f"resident memory {rss} bytes over the "
+                            f"{self.max_memory} bytes limit")
+                self.__replace(worker)
+
+    def __supervise(self):
+        while self.running:
+            for worker in list(self.worker_list):
+                if not worker.is_ready or worker.task is not None:
+                    continue
+                with self.lock:
+                    if not self.queue:
+                        break
+                    task = self.queue.popleft()
+                try:
+                    worker.send(task)
+                except OSError:
+                    # the worker died while idle, the task goes back
+                    worker.task = None
+                    with self.lock:
+                        self.queue.appendleft(task)
+            if not self.worker_list:
+                time.sleep(self.poll_interval)
+                continue
+            connections = {worker.connection: worker
+                           for worker in self.worker_list}
+            for connection in wait(list(connections), self.poll_interval):
+                self.__receive(connections[connection])
+            for worker in list(self.worker_list):
+                if worker in self.worker_list:
+                    self.__check_limits(worker)
+
+    def shutdown(self):
+        self.running = False
+        self.supervisor.join()
+        for worker in self.worker_list:
+            worker.stop()
+        with self.lock:
+            while self.queue:
+                _, _, description, future = self.queue.popleft()
+                future.set_exception(MethodTaskFailure(
+                    "error", "executor was shut down"))
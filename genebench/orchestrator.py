@@ -0,0 +1,127 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from genebench.utils import Utils
+
+
+class PipelineConfig:
+    def __init__(self, config=None):
+        config = config or {}
+        self.enabled = config.get('enabled', False)
+        # experiments loaded ahead of the methods
+        self.prefetch_experiments = config.get('prefetch_experiments', 4)
+        # finished batches waiting to be written
+        self.pending_writes = config.get('pending_writes', 16)
+
+
+class MethodResultsOrchestrator:
+    # runs generate_method_results as three stages connected by bounded
+    # queues: prefetch loads and checks the next experiments, compute runs
+    # the method batches in the executor and write stores the results.
+    # Storage reads and writes run in their own threads so they overlap
+    # with the methods, a full queue stops the stage feeding it
+    def __init__(self, benchmark, executor, config: PipelineConfig):
+        self.logger = Utils.get_logger("MethodResultsOrchestrator")
+        self.benchmark = benchmark
+        self.executor = executor
+        self.config = config
+        self.read_executor = ThreadPoolExecutor(1)
+        self.write_executor = ThreadPoolExecutor(1)
+
+    def run(self, source_methods):
+        try:
+            asyncio.run(self.__run(source_methods))
+        finally:
+            self.read_executor.shutdown()
+            self.write_executor.shutdown()
+
+    async def __run(self, source_methods):
+        inputs = asyncio.Queue(max(self.config.prefetch_experiments, 1))
+        writes = asyncio.Queue(max(self.config.pending_writes, 1))
+        await asyncio.gather(self.__prefetch(source_methods, inputs),
+                             self.__compute(inputs, writes),
+                             self.__write(writes))
+
+    async def __read(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.read_executor, function,
+                                          *args)
+
+    async def __prefetch(self, source_methods, inputs):
+        storage = self.benchmark.storage
+        for source in sorted(source_methods.keys()):
+            self.logger.info(f"get data from: {source}")
+            experiments = await self.__read(
+                lambda: list(storage.iter_geo({'source': source},
+                                              meta_only=True)))
+            for id, meta_data in enumerate(experiments):
+                gene_input, pending_methods = await self.__read(
+                    self.benchmark.prepare_experiment, source,
+                    meta_data.name, source_methods[source])
+                if not pending_methods:
+                    continue
+                self.logger.info(f"prefetched {id+1} from {source}")
+                await inputs.put((gene_input, meta_data.name,
+                                  pending_methods))
+        await inputs.put(None)
+
+    async def __compute(self, inputs, writes):
+        slots = asyncio.Semaphore(self.benchmark.config.max_pending_tasks)
+        running = set()
+        while True:
+            experiment = await inputs.get()
+            if experiment is None:
+                break
+            gene_input, exp_name, pending_methods = experiment
+            for method_name, result_key in pending_methods:
+                is_full = self.benchmark.add_to_batch(method_name,
+                                                      gene_input,
+                                                      exp_name,
+                                                      result_key)
+                if is_full:
+                    await self.__submit(method_name, slots, running, writes)
+        # the last batches of every method are not full
+        for method_name in list(self.benchmark.batches.keys()):
+            await self.__submit(method_name, slots, running, writes)
+        await asyncio.gather(*running)
+        await writes.put(None)
+
+    async def __submit(self, method_name, slots, running, writes):
+        await slots.acquire()
+        gene_inputs, tasks, profile_path = self.benchmark.pop_batch(
+            method_name)
+        # a serial executor runs the batch right here (R has to stay on
+        # the main thread), the storage threads go on in the meantime and
+        # the other stages get their turn right after
+        future = self.executor.submit(gene_inputs, method_name,
+                                      profile_path)
+        await asyncio.sleep(0)
+        task = asyncio.ensure_future(self.__finish(future, method_name,
+                                                   tasks, slots, writes))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    async def __finish(self, future, method_name, tasks, slots, writes):
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            # failures are recorded by the write stage
+            pass
+        # the slot is held until the batch is queued for writing, so a
+        # slow writer stops the compute stage and pending_writes really
+        # caps the finished batches held in memory
+        try:
+            await writes.put((method_name, tasks, future))
+        finally:
+            slots.release()
+
+    async def __write(self, writes):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await writes.get()
+            if batch is None:
+                break
+            await loop.run_in_executor(self.write_executor,
+                                       self.benchmark.store_batch_results,
+                                       *batch)
+        await loop.run_in_executor(self.write_executor,
+                                   self.benchmark.flush_method_results)
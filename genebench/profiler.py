@@ -0,0 +1,203 @@
+import os
+import sys
+import csv
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+from genebench.utils import Utils
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is then not reported
+    resource = None
+
+
+class ProfilerConfig:
+    def __init__(self, config=None, output_folder=""):
+        config = config or {}
+        self.enabled = config.get('enabled', False)
+        # "cprofile" writes a .prof file per method run (pstats, snakeviz),
+        # "pyinstrument" an html report, pyinstrument must be installed
+        self.task_profiler = config.get('task_profiler')
+        self.output_folder = os.path.join(output_folder,
+                                          config.get('folder', 'profile'))
+
+
+class Profiler:
+    # stages recorded inside the method running in this process, set
+    # while a method run is measured (see MethodWorker.run_timed)
+    task_stages = None
+
+    def __init__(self, config: ProfilerConfig):
+        self.config = config
+        self.logger = Utils.get_logger("Profiler")
+        self.records = []
+
+    @staticmethod
+    def get_rss():
+        # current resident memory of this process in bytes, None where
+        # /proc is not available
+        try:
+            with open("/proc/self/statm", "r") as statm:
+                pages = int(statm.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            return None
+        return pages * os.sysconf("SC_PAGE_SIZE")
+
+    @staticmethod
+    def get_peak_rss():
+        # peak resident memory of this process so far in bytes, it only
+        # grows so it is not the memory of the stage that reports it
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macos
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    @staticmethod
+    @contextmanager
+    def measure(record, cpu_clock=time.process_time):
+        wall_start = time.perf_counter()
+        cpu_start = cpu_clock()
+        rss_start = Profiler.get_rss()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall_start
+            record['cpu'] = cpu_clock() - cpu_start
+            # resident memory the stage added (negative when it freed)
+            rss_end = Profiler.get_rss()
+            record['rss_delta'] = None
+            if rss_start is not None and rss_end is not None:
+                record['rss_delta'] = rss_end - rss_start
+            record['peak_rss'] = Profiler.get_peak_rss()
+
+    @staticmethod
+    @contextmanager
+    def task_stage(name):
+        # sub stage of a method run (ex: "r_call"), ignored when the run
+        # is not measured
+        if Profiler.task_stages is None:
+            yield
+            return
+        with Profiler.measure({'stage': f"run.{name}"}) as record:
+            yield
+        Profiler.task_stages.append(record)
+
+    @staticmethod
+    def run_profiled(function, profile_path):
+        if profile_path.endswith(".html"):
+            from pyinstrument import Profiler as InstrumentProfiler
+            profile = InstrumentProfiler()
+            profile.start()
+            try:
+                return function()
+            finally:
+                profile.stop()
+                with open(profile_path, "w") as out:
+                    out.write(profile.output_html())
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function)
+        finally:
+            profile.dump_stats(profile_path)
+
+    @staticmethod
+    def run_task(function, profile_path=None):
+        # returns the function output and its stages, the "run" stage
+        # covers the whole call
+        Profiler.task_stages = []
+        try:
+            with Profiler.measure({'stage': 'run'}) as record:
+                if profile_path:
+                    output = Profiler.run_profiled(function, profile_path)
+                else:
+                    output = function()
+            return output, [record] + Profiler.task_stages
+        finally:
+            Profiler.task_stages = None
+
+    def is_enabled(self):
+        return self.config.enabled
+
+    @contextmanager
+    def stage(self, name, method_name=None, experiment_name=None):
+        if not self.config.enabled:
+            yield
+            return
+        record = {'stage': name,
+                  'method_name': method_name,
+                  'experiment_name': experiment_name}
+        # with the pipeline the stages run in the storage threads next to
+        # each other, so only the cpu time of the calling thread counts
+        with Profiler.measure(record, time.thread_time):
+            yield
+        self.records.append(record)
+
+    def add_task_stages(self, method_name, experiment_name, stages):
+        if not self.config.enabled:
+            return
+        for stage in stages:
+            record = dict(stage)
+            record['method_name'] = method_name
+            record['experiment_name'] = experiment_name
+            self.records.append(record)
+
+    def get_profile_path(self, method_name, experiment_name):
+        # where the task profiler of a method run writes, None when off
+        task_profiler = self.config.task_profiler
+        if not self.config.enabled or not task_profiler:
+            return None
+        extension = ".html" if task_profiler == "pyinstrument" else ".prof"
+        folder = os.path.join(self.config.output_folder, task_profiler)
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder,
+                            f"{method_name}__{experiment_name}{extension}")
+
+    def aggregate(self):
+        # totals per (method, stage), stages without a method are
+        # aggregated under an empty method name
+        totals = {}
+        for record in self.records:
+            key = (record['method_name'] or "", record['stage'])
+            if key not in totals:
+                totals[key] = {'method_name': key[0],
+                               'stage': key[1],
+                               'count': 0,
+                               'wall': 0.0,
+                               'cpu': 0.0,
+                               'max_rss_delta': None,
+                               'peak_rss': None}
+            total = totals[key]
+            total['count'] += 1
+            total['wall'] += record['wall']
+            total['cpu'] += record['cpu']
+            # the largest growth of a single record and the process peak
+            # reached by the end of the last one
+            for name, field in [('max_rss_delta', 'rss_delta'),
+                                ('peak_rss', 'peak_rss')]:
+                value = record.get(field)
+                if value is not None and (total[name] is None or
+                                          value > total[name]):
+                    total[name] = value
+        return [totals[key] for key in sorted(totals.keys())]
+
+    def export(self):
+        if not self.config.enabled:
+            return
+        os.makedirs(self.config.output_folder, exist_ok=True)
+        summary = self.aggregate()
+        json_path = os.path.join(self.config.output_folder, "profile.json")
+        with open(json_path, "w") as out:
+            json.dump({'summary': summary, 'records': self.records}, out,
+                      indent=1)
+        csv_path = os.path.join(self.config.output_folder, "profile.csv")
+        with open(csv_path, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=['method_name', 'stage',
+                                                     'count', 'wall', 'cpu',
+                                                     'max_rss_delta',
+                                                     'peak_rss'])
+            writer.writeheader()
+            writer.writerows(summary)
+        self.logger.info(f"profile written to {self.config.output_folder}")
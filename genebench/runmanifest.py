@@ -0,0 +1,161 @@
+import os
+import json
+import pickle
+import hashlib
+from genebench.utils import Utils
+
+
+class RunManifest:
+    # persistent state of a benchmark run: the (method, experiment) tasks
+    # whose results are stored, the compared methods of every method group
+    # and the metric accumulators of every compared method, so a restarted
+    # run resumes without scanning the storage again
+    VERSION = 1
+
+    def __init__(self, path):
+        self.logger = Utils.get_logger("RunManifest")
+        self.path = path
+        self.metrics_folder = path + ".metrics"
+        self.data = self.__load()
+
+    def __load(self):
+        empty = {'version': RunManifest.VERSION,
+                 'tasks': {},
+                 'failed': {},
+                 'comparisons': {}}
+        if not os.path.isfile(self.path):
+            return empty
+        with open(self.path, "r") as in_file:
+            data = json.load(in_file)
+        if data.get('version') != RunManifest.VERSION:
+            self.logger.warning(f"ignoring manifest {self.path}, "
+                                f"version {data.get('version')}")
+            return empty
+        self.logger.info(f"resuming run from {self.path}")
+        return data
+
+    @staticmethod
+    def __write_atomic(path, data, mode):
+        # a crash while saving leaves the previous file untouched
+        temp_path = path + ".tmp"
+        with open(temp_path, mode) as out:
+            out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, path)
+
+    def save(self):
+        RunManifest.__write_atomic(self.path, json.dumps(self.data), "w")
+
+    def is_task_done(self, method_name, experiment_name, method_digest,
+                     result_key):
+        # the result key also covers the input, a reimported experiment
+        # with the same name runs again
+        task = self.data['tasks'].get(method_name, {}).get(experiment_name)
+        return (task is not None and
+                task['method_digest'] == method_digest and
+                task.get('result_key') == result_key)
+
+    def mark_task_done(self, method_name, experiment_name, method_digest,
+                       result_key, seconds):
+        failed = self.data['failed'].get(method_name, {})
+        failed.pop(experiment_name, None)
+        tasks = self.data['tasks'].setdefault(method_name, {})
+        tasks[experiment_name] = {'method_digest': method_digest,
+                                  'result_key': result_key,
+                                  'seconds': seconds}
+
+    def is_task_failed(self, method_name, experiment_name, method_digest,
+                       result_key):
+        task = self.data['failed'].get(method_name, {}).get(experiment_name)
+        return (task is not None and
+                task['method_digest'] == method_digest and
+                task.get('result_key') == result_key)
+
+    def mark_task_failed(self, method_name, experiment_name, method_digest,
+                         result_key, failure):
+        # failure holds the reason, message and seconds of the failed run
+        tasks = self.data['failed'].setdefault(method_name, {})
+        tasks[experiment_name] = dict(failure, method_digest=method_digest,
+                                      result_key=result_key)
+
+    def get_failed_tasks(self):
+        return [task for tasks in self.data['failed'].values()
+                for task in tasks.values()]
+
+    def get_comparison(self, run_name, group_name):
+        runs = self.data['comparisons'].setdefault(run_name, {})
+        return runs.setdefault(group_name, {'methods': [],
+                                            'evaluated': False,
+                                            'seconds': 0.0})
+
+    def is_compared(self, run_name, group_name, method_name):
+        comparison = self.get_comparison(run_name, group_name)
+        return method_name in comparison['methods']
+
+    def mark_compared(self, run_name, group_name, method_name, seconds):
+        comparison = self.get_comparison(run_name, group_name)
+        comparison['methods'].append(method_name)
+        comparison['seconds'] += seconds
+
+    def is_evaluated(self, run_name, group_name):
+        return self.get_comparison(run_name, group_name)['evaluated']
+
+    def mark_evaluated(self, run_name, group_name, seconds):
+        comparison = self.get_comparison(run_name, group_name)
+        comparison['evaluated'] = True
+        comparison['seconds'] += seconds
+
+    def get_metrics_state_path(self, run_name, group_name, method_name):
+        key = json.dumps([run_name, group_name, method_name])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.metrics_folder, f"{digest}.pkl")
+
+    def save_metrics_state(self, run_name, group_name, method_name, state):
+        # the accumulators of a single method, written before the method
+        # is marked compared: after a crash in between the method is
+        # compared again and its file replaced, never counted twice
+        os.makedirs(self.metrics_folder, exist_ok=True)
+        path = self.get_metrics_state_path(run_name, group_name,
+                                           method_name)
+        RunManifest.__write_atomic(path, pickle.dumps(state), "wb")
+
+    def load_metrics_states(self):
+        # the saved accumulators of the compared methods of the groups not
+        # evaluated yet, methods without one are compared again
+        states = []
+        for run_name, groups in self.data['comparisons'].items():
+            for group_name, comparison in groups.items():
+                if comparison['evaluated']:
+                    continue
+                for method_name in list(comparison['methods']):
+                    path = self.get_metrics_state_path(run_name, group_name,
+                                                       method_name)
+                    if not os.path.isfile(path):
+                        self.logger.warning(f"no metrics saved for "
+                                            f"{method_name}, comparing again")
+                        comparison['methods'].remove(method_name)
+                        continue
+                    with open(path, "rb") as in_file:
+                        states.append(pickle.load(in_file))
+        return states
+
+    def remove_metrics_states(self, run_name, group_name):
+        # once the group is evaluated its accumulators are not needed
+        comparison = self.get_comparison(run_name, group_name)
+        for method_name in comparison['methods']:
+            path = self.get_metrics_state_path(run_name, group_name,
+                                               method_name)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def get_timings(self):
+        # seconds spent by every method on the stored experiments
+        timings = {}
+        for method_name, tasks in self.data['tasks'].items():
+            # tasks found in the storage have no timing
+            seconds = [task['seconds'] for task in tasks.values()
+                       if task['seconds'] is not None]
+            timings[method_name] = {'tasks': len(seconds),
+                                    'seconds': sum(seconds)}
+        return timings
@@ -0,0 +1,50 @@
+import os
+import json
+
+
+class ResultsPack:
+    # append only container for method results: one json record per line,
+    # the storage index keeps the offset and length of every record so a
+    # batch of results costs one open, one write and one fsync
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, records):
+        lines = [(json.dumps(record) + "\n").encode('utf-8')
+                 for record in records]
+        locations = []
+        with open(self.path, "ab") as out:
+            offset = out.tell()
+            for line in lines:
+                locations.append((offset, len(line), line))
+                offset += len(line)
+            out.write(b"".join(lines))
+            out.flush()
+            os.fsync(out.fileno())
+        return locations
+
+    @staticmethod
+    def read(path, offset, length):
+        with open(path, "rb") as in_file:
+            in_file.seek(offset)
+            return json.loads(in_file.read(length))
+
+    @staticmethod
+    def read_many(path, locations):
+        # locations are (offset, length) pairs, the file is opened once
+        records = []
+        with open(path, "rb") as in_file:
+            for offset, length in locations:
+                in_file.seek(offset)
+                records.append(json.loads(in_file.read(length)))
+        return records
+
+    def scan(self):
+        if not os.path.isfile(self.path):
+            return
+        offset = 0
+        with open(self.path, "rb") as in_file:
+            for line in in_file:
+                if line.endswith(b"\n"):
+                    yield offset, len(line), line, json.loads(line)
+                offset += len(line)
@@ -1,13 +1,20 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from genebench.utils import Utils
 from genebench.storage.storageprovidermongo import StorageProviderMongo
 from genebench.storage.storageproviderfilesystem import StorageProviderFileSystem
+from genebench.storage.storageproviderbinary import StorageProviderBinary
+from genebench.storage.storagecache import StorageCache
 from genebench.datatypes import GeneDiffValidation, GeoData, GeneMethodResult
+from genebench.datatypes import GeneVocabulary
 
 
 class StorageConfig:
     def __init__(self,  dict):
         self.load_order = dict['load_order']
         self.providers = dict['providers']
+        self.insert_batch_size = dict.get('insert_batch_size', 100)
+        self.cache = dict.get('cache', {})
 
 
 class Storage:
@@ -18,55 +25,201 @@ class Storage:
             return StorageProviderMongo(config)
         if name == 'filesystem':
             return StorageProviderFileSystem(config)
+        if name == 'binary':
+            return StorageProviderBinary(config)
         return None
 
-    def __init__(self, config_filename):
+    def __init__(self, config_filename, providers=None):
+        # providers can be passed in already created, by name (ex: mongo
+        # on a mongomock client), the other ones are created from config
         self.logger = Utils.get_logger('Storage')
         config_section = Utils.get_config(config_filename, "Storage")
         self.config = StorageConfig(config_section)
-        self.providers = {}
+        self.providers = dict(providers or {})
+        self.results_buffer = []
+        # results can be buffered by one thread while another one checks
+        # them, a flushing buffer is locked until the results are stored
+        self.buffer_lock = threading.RLock()
+        self.vocabulary = None
+        self.cache = StorageCache(self.config.cache)
+        self.tier_stats = {}
+        self.vocabulary_synced = set()
         providers = self.config.providers
         for provider_name, provider_json_config in providers.items():
+            if provider_name in self.providers:
+                continue
             self.providers[provider_name] = Storage.create_provider(
                 provider_name, provider_json_config)
+        for provider_name in self.config.load_order:
+            if provider_name not in self.providers:
+                raise ValueError(f"storage provider {provider_name} is in "
+                                 f"load_order but not configured")
+            self.tier_stats[provider_name] = {'hits': 0, 'fills': 0}
         self.logger.info(f"Started storage with config {config_section}")
 
+    def __get_backing_provider(self):
+        # the last provider in load_order is the slowest and most complete
+        # one, listings are answered by it
+        return self.providers[self.config.load_order[-1]]
+
+    def __read_through(self, key, load, fill):
+        # providers are tiers ordered by load_order, the first one holding
+        # the data answers and every faster tier that missed it is filled
+        value = self.cache.get(key) if self.cache.is_enabled() else None
+        if value is not None:
+            return value
+        missed = []
+        for provider_name in self.config.load_order:
+            provider = self.providers[provider_name]
+            value = load(provider)
+            if value is None:
+                missed.append(provider_name)
+                continue
+            self.tier_stats[provider_name]['hits'] += 1
+            for missed_name in missed:
+                self.logger.info(f"filling {missed_name} with {key}")
+                fill(missed_name, self.providers[missed_name], value)
+                self.tier_stats[missed_name]['fills'] += 1
+            self.cache.put(key, value)
+            return value
+        return None
+
+    def get_cache_stats(self):
+        stats = self.cache.get_stats()
+        stats['tiers'] = {name: dict(tier_stats) for name, tier_stats
+                          in self.tier_stats.items()}
+        return stats
+
+    def reindex(self):
+        # after changing the data files by hand, file providers rebuild
+        # their index and nothing cached is kept
+        for provider in self.providers.values():
+            provider.reindex()
+        self.cache.invalidate()
+
+    def get_vocabulary(self) -> GeneVocabulary:
+        # the vocabularies of all the tiers are merged, a stale tier must
+        # not hand out ids the other tiers already gave to other genes
+        if self.vocabulary is None:
+            self.vocabulary = GeneVocabulary()
+            for provider_name in self.config.load_order:
+                stored = self.providers[provider_name].get_vocabulary()
+                if stored is not None:
+                    self.vocabulary.merge(stored.names)
+        return self.vocabulary
+
+    def save_vocabulary(self):
+        # providers merge with what they store, genes other processes
+        # appended meanwhile are adopted and conflicting ids raise a
+        # VocabularyConflict instead of being written
+        vocabulary = self.get_vocabulary()
+        if not vocabulary.is_dirty:
+            return
+        for provider_name in self.config.load_order:
+            self.providers[provider_name].insert_vocabulary(vocabulary)
+        vocabulary.is_dirty = False
+
     def insert_validation(self, data: GeneDiffValidation):
+        data.intern(self.get_vocabulary())
+        self.save_vocabulary()
+        self.cache.remove(('validation', data.source))
         for provider_name in self.config.load_order:
             self.providers[provider_name].insert_validation(data)
 
-    def delete_validation(self):
+    def delete_validation(self, source=None):
+        if source is None:
+            self.cache.invalidate('validation')
+        else:
+            self.cache.remove(('validation', source))
         for provider_name in self.config.load_order:
-            self.providers[provider_name].delete_validation()
+            self.providers[provider_name].delete_validation(source)
 
     def get_validation_data(self, source, tf) -> GeneDiffValidation:
-        for provider_name in self.config.load_order:
-            provider = self.providers[provider_name]
-            return provider.get_validation_data(source, tf)
+        def fill(_, provider, data):
+            provider.insert_validation(data)
+        data = self.__read_through(
+            ('validation', source),
+            lambda provider: provider.get_validation_data(source, tf),
+            fill)
+        if data is not None:
+            data.vocabulary = self.get_vocabulary()
+        return data
 
     def get_validation_sources(self):
-        for provider_name in self.config.load_order:
-            return self.providers[provider_name].get_validation_sources()
+        return self.__get_backing_provider().get_validation_sources()
 
     def delete_geo(self):
+        self.cache.invalidate('geo')
         for provider_name in self.config.load_order:
             self.providers[provider_name].delete_geo()
 
     def insert_geo(self, data: GeoData):
+        self.cache.remove(('geo', data.source, data.name))
         for provider_name in self.config.load_order:
             self.providers[provider_name].insert_geo(data)
 
-    def get_geo(self, filter) -> GeoData:
+    def insert_many_geo(self, datas):
+        for data in datas:
+            self.cache.remove(('geo', data.source, data.name))
         for provider_name in self.config.load_order:
-            return self.providers[provider_name].get_geo(filter)
+            self.providers[provider_name].insert_many_geo(datas)
+
+    def __get_single_geo(self, source, name):
+        def load(provider):
+            datas = provider.get_geo({'source': source, 'name': name})
+            if not datas:
+                return None
+            return datas[0]
+
+        def fill(_, provider, data):
+            provider.insert_geo(data)
+        return self.__read_through(('geo', source, name), load, fill)
+
+    def get_geo(self, filter) -> GeoData:
+        return list(self.iter_geo(filter))
+
+    def iter_geo(self, filter, meta_only=False):
+        if meta_only:
+            return self.__get_backing_provider().iter_geo(filter, True)
+        if len(self.config.load_order) == 1 and not self.cache.is_enabled():
+            provider = self.__get_backing_provider()
+            return provider.iter_geo(filter)
+        return self.__iter_tiered_geo(filter)
+
+    def __iter_tiered_geo(self, filter):
+        # the experiment list comes from the backing tier, every experiment
+        # is then read through the cache and the faster tiers
+        backing_provider = self.__get_backing_provider()
+        for meta_data in backing_provider.iter_geo(filter, True):
+            data = self.__get_single_geo(meta_data.source, meta_data.name)
+            if data is not None:
+                yield data
 
     def has_method_results(self,
                            method_name: str,
-                           experiment_name: str):
+                           experiment_name: str,
+                           result_key=None):
+        # without a result_key any stored result for the names matches,
+        # otherwise only one computed from the same method and input
+        def is_valid(result):
+            return result_key is None or result.result_key == result_key
+        with self.buffer_lock:
+            for result, buffered_method, buffered_experiment in \
+                    self.results_buffer:
+                if (buffered_method == method_name and
+                        buffered_experiment == experiment_name and
+                        is_valid(result)):
+                    return True
+        key = ('results', method_name, experiment_name)
+        if self.cache.contains(key):
+            cached_result = self.cache.get(key)
+            if cached_result is not None and is_valid(cached_result):
+                return True
         for provider_name in self.config.load_order:
             provider = self.providers[provider_name]
             has = provider.has_method_results(method_name,
-                                              experiment_name)
+                                              experiment_name,
+                                              result_key)
             if has:
                 return True
         return False
@@ -75,13 +228,150 @@ class Storage:
                               result: GeneMethodResult,
                               method_name: str,
                               experiment_name: str):
-
+        # results refer to genes by vocabulary id, the vocabulary is
+        # always saved before the results using it
+        result.intern(self.get_vocabulary())
+        self.save_vocabulary()
+        self.cache.remove(('results', method_name, experiment_name))
         for provider_name in self.config.load_order:
             provider = self.providers[provider_name]
             provider.insert_method_results(result,
                                            method_name,
                                            experiment_name)
 
-    def get_method_results(self, filter):
+    def insert_many_method_results(self, entries):
+        vocabulary = self.get_vocabulary()
+        for result, method_name, experiment_name in entries:
+            result.intern(vocabulary)
+            self.cache.remove(('results', method_name, experiment_name))
+        self.save_vocabulary()
+        for provider_name in self.config.load_order:
+            provider = self.providers[provider_name]
+            provider.insert_many_method_results(entries)
+
+    def buffer_method_results(self,
+                              result: GeneMethodResult,
+                              method_name: str,
+                              experiment_name: str):
+        # results are written in bulk by flush_method_results, returns True
+        # once insert_batch_size of them are waiting
+        with self.buffer_lock:
+            self.results_buffer.append((result, method_name,
+                                        experiment_name))
+            return len(self.results_buffer) >= self.config.insert_batch_size
+
+    def has_buffered_results(self):
+        with self.buffer_lock:
+            return len(self.results_buffer) > 0
+
+    def flush_method_results(self):
+        with self.buffer_lock:
+            if not self.results_buffer:
+                return
+            entries = self.results_buffer
+            self.results_buffer = []
+            self.insert_many_method_results(entries)
+
+    def __fill_method_results(self, provider_name, entries):
+        # stored results refer to vocabulary ids, so the vocabulary
+        # goes to a tier before the first result filled into it
+        provider = self.providers[provider_name]
+        if provider_name not in self.vocabulary_synced:
+            provider.insert_vocabulary(self.get_vocabulary())
+            self.vocabulary_synced.add(provider_name)
+        provider.insert_many_method_results(entries)
+
+    def get_many_method_results(self, method_name, experiment_names):
+        # batched read through: every tier is asked once for the results
+        # the cache and the faster tiers did not have
+        results = {}
+        missing = []
+        for experiment_name in experiment_names:
+            key = ('results', method_name, experiment_name)
+            result = self.cache.get(key) if self.cache.is_enabled() else None
+            if result is None:
+                missing.append(experiment_name)
+            else:
+                results[experiment_name] = result
+        missed_tiers = []
         for provider_name in self.config.load_order:
-            return self.providers[provider_name].get_method_results(filter)
+            if not missing:
+                break
+            provider = self.providers[provider_name]
+            found = provider.get_many_method_results(method_name, missing)
+            if found:
+                self.tier_stats[provider_name]['hits'] += len(found)
+                entries = [(result, method_name, experiment_name)
+                           for experiment_name, result in found.items()]
+                for missed_name in missed_tiers:
+                    self.__fill_method_results(missed_name, entries)
+                    self.tier_stats[missed_name]['fills'] += len(entries)
+                for experiment_name, result in found.items():
+                    key = ('results', method_name, experiment_name)
+                    self.cache.put(key, result)
+                results.update(found)
+                missing = [name for name in missing if name not in found]
+            missed_tiers.append(provider_name)
+        vocabulary = self.get_vocabulary()
+        for result in results.values():
+            if result.vocabulary is None:
+                result.vocabulary = vocabulary
+        return results
+
+    def iter_method_results(self, method_name, experiment_names,
+                            batch_size=None):
+        # yields (experiment_name, result) in the given order, the next
+        # batch is loaded by a background thread while the current one is
+        # consumed, missing results are skipped
+        batch_size = batch_size or self.config.insert_batch_size
+        experiment_names = list(experiment_names)
+        batches = [experiment_names[start:start + batch_size]
+                   for start in range(0, len(experiment_names), batch_size)]
+        if not batches:
+            return
+        # loaded here so the background thread never creates it
+        self.get_vocabulary()
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(self.get_many_method_results,
+                                     method_name, batches[0])
+            for idx, batch in enumerate(batches):
+                results = future.result()
+                if idx + 1 < len(batches):
+                    future = executor.submit(self.get_many_method_results,
+                                             method_name, batches[idx + 1])
+                for experiment_name in batch:
+                    if experiment_name in results:
+                        yield experiment_name, results[experiment_name]
+
+    def __get_single_method_results(self, method_name, experiment_name):
+        filter = {'method_name': method_name,
+                  'experiment_name': experiment_name}
+
+        def load(provider):
+            results = provider.get_method_results(filter)
+            if not results:
+                return None
+            return results[0]
+
+        def fill(provider_name, provider, result):
+            self.__fill_method_results(provider_name,
+                                       [(result, method_name,
+                                         experiment_name)])
+        key = ('results', method_name, experiment_name)
+        return self.__read_through(key, load, fill)
+
+    def get_method_results(self, filter):
+        if 'method_name' in filter and 'experiment_name' in filter:
+            result = self.__get_single_method_results(
+                filter['method_name'], filter['experiment_name'])
+            results = [] if result is None else [result]
+        else:
+            # a partial filter is a listing: the faster tiers may only
+            # hold some of the results
+            provider = self.__get_backing_provider()
+            results = provider.get_method_results(filter)
+        vocabulary = self.get_vocabulary()
+        for result in results:
+            if result is not None and result.vocabulary is None:
+                result.vocabulary = vocabulary
+        return results
@@ -0,0 +1,119 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from genebench.datatypes import GeoData, GeneMethodResult, GeneDiffValidation
+
+
+class StorageCacheConfig:
+    def __init__(self, config=None):
+        config = config or {}
+        # 256MB by default, 0 disables the cache
+        self.max_bytes = config.get('max_bytes', 268435456)
+
+
+class StorageCache:
+    # least recently used cache of loaded objects bounded by their
+    # approximate size in bytes, it sits in front of the storage providers
+    def __init__(self, config: dict = None):
+        self.config = StorageCacheConfig(config)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    @staticmethod
+    def __array_size(array):
+        if array is None:
+            return 0
+        if isinstance(array, np.ndarray):
+            return array.nbytes
+        # json loaded nested lists, a python float is 24 bytes and every
+        # list slot a pointer
+        rows = len(array)
+        columns = len(array[0]) if rows and isinstance(array[0], list) else 1
+        return rows * columns * 32
+
+    @staticmethod
+    def size_of(value):
+        if isinstance(value, GeoData):
+            size = StorageCache.__array_size(value.control_array)
+            size += StorageCache.__array_size(value.perturbed_array)
+            return size + sys.getsizeof(value.genes) * 2
+        if isinstance(value, GeneMethodResult):
+            size = value.scores.nbytes
+            if value.gene_ids is not None:
+                size += value.gene_ids.nbytes
+            else:
+                size += value.genes.nbytes
+            return size
+        if isinstance(value, GeneDiffValidation):
+            return sum(sys.getsizeof(genes) * 2
+                       for genes in value.data.values())
+        return sys.getsizeof(value)
+
+    def is_enabled(self):
+        return self.config.max_bytes > 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if not self.is_enabled() or value is None:
+            return
+        size = StorageCache.size_of(value)
+        with self.lock:
+            if size > self.config.max_bytes:
+                self.rejected += 1
+                return
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.bytes -= old_entry[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.config.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def remove(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+
+    def invalidate(self, section=None):
+        # keys are tuples starting with their section name
+        with self.lock:
+            if section is None:
+                self.entries.clear()
+                self.bytes = 0
+                return
+            for key in [k for k in self.entries if k[0] == section]:
+                self.bytes -= self.entries.pop(key)[1]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.config.max_bytes
+            }
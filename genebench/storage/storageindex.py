@@ -0,0 +1,211 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+
+
+class StorageIndex:
+    # bump when the schema changes, an index with another version is
+    # dropped and rebuilt from the files on disk
+    VERSION = 4
+
+    def __init__(self, path, folders=()):
+        # folders holding the indexed files, their state is recorded with
+        # every write so changes made outside the provider are detected
+        self.path = path
+        self.folders = list(folders)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.is_new = self.__create_tables()
+
+    @staticmethod
+    def checksum(*chunks):
+        # md5 of the concatenated chunks (bytes or contiguous arrays),
+        # fed one by one so they are never joined in memory
+        md5 = hashlib.md5()
+        for chunk in chunks:
+            md5.update(chunk)
+        return md5.hexdigest()
+
+    def __create_tables(self):
+        with self.lock, self.connection:
+            cursor = self.connection.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] == StorageIndex.VERSION:
+                return False
+            for table in ["geo", "results", "validation", "state"]:
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self.connection.execute(
+                "CREATE TABLE geo ("
+                "name TEXT, source TEXT, pf TEXT, num_genes INTEGER, "
+                "num_control INTEGER, num_perturbed INTEGER, "
+                "path TEXT, checksum TEXT, meta TEXT, "
+                "PRIMARY KEY (source, name))")
+            self.connection.execute(
+                "CREATE INDEX geo_name ON geo (name)")
+            self.connection.execute(
+                "CREATE INDEX geo_pf ON geo (pf)")
+            self.connection.execute(
+                "CREATE TABLE results ("
+                "method_name TEXT, experiment_name TEXT, "
+                "path TEXT, checksum TEXT, "
+                "offset INTEGER, length INTEGER, result_key TEXT, "
+                "PRIMARY KEY (method_name, experiment_name))")
+            self.connection.execute(
+                "CREATE INDEX results_experiment "
+                "ON results (experiment_name)")
+            self.connection.execute(
+                "CREATE TABLE validation ("
+                "source TEXT PRIMARY KEY, path TEXT)")
+            self.connection.execute(
+                "CREATE TABLE state (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute(
+                f"PRAGMA user_version = {StorageIndex.VERSION}")
+        return True
+
+    def get_folders_state(self):
+        # modification times of the folders and their sub folders (a file
+        # added, removed or renamed changes them) and size and time of the
+        # files directly in them (validation files, results packs). Files
+        # replaced in place inside a sub folder need an explicit reindex
+        state = {}
+        for folder in self.folders:
+            if not os.path.isdir(folder):
+                continue
+            state[folder] = os.stat(folder).st_mtime_ns
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    stat = entry.stat()
+                    if entry.is_dir():
+                        state[entry.path] = stat.st_mtime_ns
+                    else:
+                        state[entry.path] = [stat.st_size, stat.st_mtime_ns]
+        return json.dumps(state, sort_keys=True)
+
+    def save_folders_state(self):
+        self.__execute("INSERT OR REPLACE INTO state VALUES (?, ?)",
+                       ("folders", self.get_folders_state()))
+
+    def is_outdated(self):
+        rows = self.__execute("SELECT value FROM state WHERE key = ?",
+                              ("folders",))
+        return not rows or rows[0][0] != self.get_folders_state()
+
+    def clear(self):
+        for table in ["geo", "results", "validation", "state"]:
+            self.__execute(f"DELETE FROM {table}")
+
+    def __execute(self, query, parameters=()):
+        with self.lock, self.connection:
+            return self.connection.execute(query, parameters).fetchall()
+
+    def __execute_many(self, query, parameters):
+        # a single transaction for the whole batch
+        with self.lock, self.connection:
+            self.connection.executemany(query, parameters)
+
+    def __build_where(self, filter, fields):
+        clauses = []
+        parameters = []
+        for field in fields:
+            if field in filter:
+                clauses.append(f"{field} = ?")
+                parameters.append(filter[field])
+        if not clauses:
+            return "", parameters
+        return " WHERE " + " AND ".join(clauses), parameters
+
+    def __geo_row(self, meta_data, path, checksum,
+                  num_control, num_perturbed):
+        return (meta_data['name'], meta_data['source'], meta_data['pf'],
+                len(meta_data['genes']), num_control, num_perturbed,
+                path, checksum, json.dumps(meta_data))
+
+    def insert_geo(self, meta_data, path, checksum,
+                   num_control, num_perturbed):
+        self.insert_many_geo([(meta_data, path, checksum,
+                               num_control, num_perturbed)])
+
+    def insert_many_geo(self, entries):
+        rows = [self.__geo_row(*entry) for entry in entries]
+        self.__execute_many(
+            "INSERT OR REPLACE INTO geo VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows)
+        self.save_folders_state()
+
+    def delete_geo(self):
+        self.__execute("DELETE FROM geo")
+        self.save_folders_state()
+
+    def find_geo(self, filter):
+        where, parameters = self.__build_where(filter,
+                                               ["name", "source", "pf"])
+        query = f"SELECT path, meta FROM geo{where} ORDER BY source, name"
+        rows = self.__execute(query, parameters)
+        return [(path, json.loads(meta)) for path, meta in rows]
+
+    def insert_results(self, method_name, experiment_name, path, checksum,
+                       offset=None, length=None, result_key=None):
+        self.insert_many_results([(method_name, experiment_name, path,
+                                   checksum, offset, length, result_key)])
+
+    def insert_many_results(self, entries):
+        # entries are (method_name, experiment_name, path, checksum,
+        # offset, length, result_key), offset and length are None for
+        # whole files
+        self.__execute_many(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            entries)
+        self.save_folders_state()
+
+    def find_results(self, filter):
+        where, parameters = self.__build_where(filter,
+                                               ["method_name",
+                                                "experiment_name"])
+        query = (f"SELECT path, offset, length FROM results{where} "
+                 "ORDER BY method_name, experiment_name")
+        return self.__execute(query, parameters)
+
+    def find_many_results(self, method_name, experiment_names,
+                          chunk_size=500):
+        # rows are (experiment_name, path, offset, length) sorted by their
+        # location so files and packs are read sequentially
+        experiment_names = list(experiment_names)
+        rows = []
+        for start in range(0, len(experiment_names), chunk_size):
+            chunk = experiment_names[start:start + chunk_size]
+            marks = ", ".join("?" * len(chunk))
+            rows.extend(self.__execute(
+                "SELECT experiment_name, path, offset, length FROM results "
+                f"WHERE method_name = ? AND experiment_name IN ({marks})",
+                [method_name] + chunk))
+        rows.sort(key=lambda row: (row[1], row[2] or 0))
+        return rows
+
+    def has_results(self, method_name, experiment_name, result_key=None):
+        query = ("SELECT 1 FROM results "
+                 "WHERE method_name = ? AND experiment_name = ?")
+        parameters = [method_name, experiment_name]
+        if result_key is not None:
+            query += " AND result_key = ?"
+            parameters.append(result_key)
+        rows = self.__execute(query + " LIMIT 1", parameters)
+        return len(rows) > 0
+
+    def insert_validation(self, source, path):
+        self.__execute("INSERT OR REPLACE INTO validation VALUES (?, ?)",
+                       (source, path))
+        self.save_folders_state()
+
+    def delete_validation(self, source=None):
+        if source is None:
+            self.__execute("DELETE FROM validation")
+        else:
+            self.__execute("DELETE FROM validation WHERE source = ?",
+                           (source,))
+        self.save_folders_state()
+
+    def get_validation_sources(self):
+        rows = self.__execute("SELECT source FROM validation "
+                              "ORDER BY source")
+        return [row[0] for row in rows]
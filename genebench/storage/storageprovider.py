@@ -1,11 +1,22 @@
 from genebench.datatypes import GeneMethodResult, GeoData, GeneDiffValidation
+from genebench.datatypes import GeneVocabulary
 
 
 class StorageProvider:
+    def reindex(self):
+        pass
+
+    def insert_vocabulary(self, vocabulary: GeneVocabulary):
+        pass
+
+    def get_vocabulary(self) -> GeneVocabulary:
+        return None
+
     def insert_validation(self, data: GeneDiffValidation):
         pass
 
-    def delete_validation(self):
+    def delete_validation(self, source=None):
+        # all the validation data, or only the one of source
         pass
 
     def get_validation_data(self, source, tf) -> GeneDiffValidation:
@@ -20,20 +31,46 @@ class StorageProvider:
     def insert_geo(self, data: GeoData):
         pass
 
+    def insert_many_geo(self, datas):
+        for data in datas:
+            self.insert_geo(data)
+
     def get_geo(self, filter) -> GeoData:
         pass
 
+    def iter_geo(self, filter, meta_only=False):
+        for data in self.get_geo(filter):
+            if meta_only:
+                data = GeoData.from_meta_data(data.get_meta_data())
+            yield data
+
     def insert_method_results(self,
                               result: GeneMethodResult,
                               method_name: str,
                               experiment_name: str):
         pass
 
-    def get_method_results(self,
-                           method_name: str,
-                           experiment_name: str):
+    def insert_many_method_results(self, entries):
+        for result, method_name, experiment_name in entries:
+            self.insert_method_results(result, method_name, experiment_name)
+
+    def get_method_results(self, filter):
+        # filter on method_name, experiment_name and result_key
         pass
 
-    def has_method_results(method_name: str,
-                           experiment_name: str):
+    def get_many_method_results(self, method_name, experiment_names):
+        # experiment name -> result, missing results are left out
+        ret_data = {}
+        for experiment_name in experiment_names:
+            results = self.get_method_results({
+                'method_name': method_name,
+                'experiment_name': experiment_name})
+            if results:
+                ret_data[experiment_name] = results[0]
+        return ret_data
+
+    def has_method_results(self,
+                           method_name: str,
+                           experiment_name: str,
+                           result_key=None):
         pass
@@ -0,0 +1,110 @@
+import os
+import json
+import tempfile
+import numpy as np
+from genebench.utils import Utils
+from genebench.storage.storageproviderfile import StorageProviderFile
+from genebench.storage.storageindex import StorageIndex
+from genebench.datatypes import GeoData
+
+
+class BinaryConfig:
+    def __init__(self,
+                 base_path,
+                 validation_folder,
+                 geo_folder,
+                 results_folder,
+                 dtype="float32",
+                 memory_map=False,
+                 index_file="index.sqlite",
+                 results_pack="results.pack",
+                 vocabulary_file="genes.json"):
+        self.base_path = base_path
+        self.validation_folder = validation_folder
+        self.geo_folder = geo_folder
+        self.results_folder = results_folder
+        self.dtype = dtype
+        self.memory_map = memory_map
+        self.index_file = index_file
+        self.results_pack = results_pack
+        self.vocabulary_file = vocabulary_file
+
+
+class StorageProviderBinary(StorageProviderFile):
+    # experiments are split in a small json sidecar holding the meta data
+    # and one typed .npy blob for each expression matrix, so loading does
+    # not go through python float lists
+    META_EXTENSION = ".json"
+    CONTROL_EXTENSION = ".control.npy"
+    PERTURBED_EXTENSION = ".perturbed.npy"
+
+    def __init__(self, config: dict):
+        self.logger = Utils.get_logger("StorageProviderBinary")
+        config = BinaryConfig(**config)
+        self.dtype = np.dtype(config.dtype)
+        # read only memory maps, pages are touched only when a method
+        # actually reads the values
+        self.mmap_mode = 'r' if config.memory_map else None
+        super().__init__(config)
+
+    def __geo_checksum(self, raw_meta, control, perturbed):
+        # the arrays are hashed from their buffers (memory maps when
+        # indexing), not copied into one bytes object
+        return StorageIndex.checksum(raw_meta,
+                                     np.ascontiguousarray(control),
+                                     np.ascontiguousarray(perturbed))
+
+    def __save_array(self, path, array):
+        # readers may have the old file memory mapped, truncating it in
+        # place can crash them (SIGBUS) or mix old and new values, so the
+        # array is written next to it and swapped in
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                             suffix='.tmp')
+        try:
+            with os.fdopen(handle, "wb") as out:
+                np.save(out, array)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _list_geo_files(self, folder):
+        files = Utils.list_files_in_folder(folder)
+        return [x for x in files if x.endswith(self.META_EXTENSION)]
+
+    def _read_geo_index_entry(self, meta_path):
+        base = meta_path[:-len(self.META_EXTENSION)]
+        control = np.load(base + self.CONTROL_EXTENSION, mmap_mode='r')
+        perturbed = np.load(base + self.PERTURBED_EXTENSION, mmap_mode='r')
+        with open(meta_path, "rb") as in_file:
+            raw_meta = in_file.read()
+        meta_data = json.loads(raw_meta)
+        checksum = self.__geo_checksum(raw_meta, control, perturbed)
+        return self._get_geo_index_entry(GeoData.from_meta_data(meta_data),
+                                         control,
+                                         perturbed,
+                                         meta_path,
+                                         checksum)
+
+    def _write_geo(self, data: GeoData):
+        folder = os.path.join(self.geo_path, data.source)
+        Utils.create_folder_if_not_exist(folder)
+        base = os.path.join(folder, data.name)
+        control = np.asarray(data.control_array, dtype=self.dtype)
+        perturbed = np.asarray(data.perturbed_array, dtype=self.dtype)
+        self.__save_array(base + self.CONTROL_EXTENSION, control)
+        self.__save_array(base + self.PERTURBED_EXTENSION, perturbed)
+        meta_path = base + self.META_EXTENSION
+        raw_meta = self._write_json(meta_path, data.get_meta_data())
+        checksum = self.__geo_checksum(raw_meta, control, perturbed)
+        return self._get_geo_index_entry(data, control, perturbed,
+                                         meta_path, checksum)
+
+    def _load_geo(self, meta_path, meta_data):
+        base = meta_path[:-len(self.META_EXTENSION)]
+        meta_data['control_array'] = np.load(base + self.CONTROL_EXTENSION,
+                                             mmap_mode=self.mmap_mode)
+        meta_data['perturbed_array'] = np.load(base +
+                                               self.PERTURBED_EXTENSION,
+                                               mmap_mode=self.mmap_mode)
+        return GeoData(meta_data)
@@ -0,0 +1,272 @@
+import os
+import json
+from typing import List
+from genebench.utils import Utils
+from genebench.storage.storageprovider import StorageProvider
+from genebench.storage.storageindex import StorageIndex
+from genebench.storage.resultspack import ResultsPack
+from genebench.storage.vocabularyfile import VocabularyFile
+from genebench.datatypes import GeneDiffValidation, GeoData, GeneMethodResult
+from genebench.datatypes import GeneVocabulary
+
+
+class StorageProviderFile(StorageProvider):
+    # shared part of the providers keeping their data in a folder:
+    # validation json files, method results (json files and the results
+    # pack), the vocabulary file and the sqlite index answering queries.
+    # Subclasses only decide how experiments are written and read
+    # (_write_geo, _read_geo_index_entry, _load_geo, _list_geo_files)
+
+    def __init__(self, config):
+        # config holds base_path, the validation, geo and results folders
+        # and the index, results pack and vocabulary file names
+        self.config = config
+        base_path = self.config.base_path
+        Utils.create_folder_if_not_exist(base_path)
+        self.geo_path = os.path.join(base_path,
+                                     self.config.geo_folder)
+        Utils.create_folder_if_not_exist(self.geo_path)
+        self.validation_path = os.path.join(base_path,
+                                            self.config.validation_folder)
+        Utils.create_folder_if_not_exist(self.validation_path)
+        self.results_path = os.path.join(base_path,
+                                         self.config.results_folder)
+        Utils.create_folder_if_not_exist(self.results_path)
+        self.results_pack = ResultsPack(os.path.join(self.results_path,
+                                                     self.config.results_pack))
+        self.vocabulary_file = VocabularyFile(
+            os.path.join(base_path, self.config.vocabulary_file))
+        # queries are answered from the index, the files are only opened
+        # when their content is needed
+        self.index = StorageIndex(os.path.join(base_path,
+                                               self.config.index_file),
+                                  [self.geo_path, self.validation_path,
+                                   self.results_path])
+        if self.index.is_new:
+            self.reindex()
+        elif self.index.is_outdated():
+            # files were added, removed or replaced outside the provider
+            self.logger.info("data files changed, rebuilding the index")
+            self.reindex()
+
+    def reindex(self):
+        # rebuilds the index from the files on disk
+        self.index.clear()
+        self.__rebuild_index()
+        self.index.save_folders_state()
+
+    def _relative_path(self, path):
+        return os.path.relpath(path, self.config.base_path)
+
+    def _absolute_path(self, path):
+        return os.path.join(self.config.base_path, path)
+
+    def _load_json(self, path):
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as in_file:
+            return json.load(in_file)
+
+    def _write_json(self, path, data, cls=None):
+        raw_data = json.dumps(data, cls=cls).encode('utf-8')
+        with open(path, "wb") as out:
+            out.write(raw_data)
+        return raw_data
+
+    def _get_geo_index_entry(self, data: GeoData, control, perturbed,
+                             path, checksum):
+        # the expression values are genes x samples, or samples x genes
+        if len(control) < len(data.genes):
+            num_control = len(control)
+            num_perturbed = len(perturbed)
+        else:
+            num_control = len(control[0]) if len(control) else 0
+            num_perturbed = len(perturbed[0]) if len(perturbed) else 0
+        return (data.get_meta_data(),
+                self._relative_path(path),
+                checksum,
+                num_control,
+                num_perturbed)
+
+    def _list_geo_files(self, folder):
+        # files of the experiments of a source folder
+        return Utils.list_files_in_folder(folder)
+
+    def _read_geo_index_entry(self, path):
+        # index entry of an experiment file written by _write_geo
+        pass
+
+    def _write_geo(self, data: GeoData):
+        # writes the experiment and returns its index entry
+        pass
+
+    def _load_geo(self, path, meta_data) -> GeoData:
+        pass
+
+    def __get_pack_index_entries(self, records, locations):
+        pack_path = self._relative_path(self.results_pack.path)
+        entries = []
+        for record, location in zip(records, locations):
+            offset, length, line = location
+            entries.append((record['method_name'],
+                            record['experiment_name'],
+                            pack_path,
+                            StorageIndex.checksum(line),
+                            offset,
+                            length,
+                            record['result'].get('result_key')))
+        return entries
+
+    def __rebuild_index(self):
+        for file_path in Utils.list_files_in_folder(self.validation_path):
+            source = os.path.basename(file_path)[:-5]
+            self.index.insert_validation(source,
+                                         self._relative_path(file_path))
+
+        for folder in Utils.list_folders_in_folder(self.geo_path):
+            folder_path = os.path.join(self.geo_path, folder)
+            for file_path in self._list_geo_files(folder_path):
+                self.index.insert_geo(*self._read_geo_index_entry(file_path))
+
+        for method_name in Utils.list_folders_in_folder(self.results_path):
+            method_folder = os.path.join(self.results_path, method_name)
+            for file_path in Utils.list_files_in_folder(method_folder):
+                experiment_name = os.path.basename(file_path)[:-5]
+                with open(file_path, "rb") as in_file:
+                    raw_data = in_file.read()
+                result_key = json.loads(raw_data).get('result_key')
+                self.index.insert_results(method_name,
+                                          experiment_name,
+                                          self._relative_path(file_path),
+                                          StorageIndex.checksum(raw_data),
+                                          result_key=result_key)
+
+        records = []
+        locations = []
+        for offset, length, line, record in self.results_pack.scan():
+            records.append(record)
+            locations.append((offset, length, line))
+        self.index.insert_many_results(
+            self.__get_pack_index_entries(records, locations))
+
+    def insert_vocabulary(self, vocabulary: GeneVocabulary):
+        self.vocabulary_file.save(vocabulary)
+
+    def get_vocabulary(self) -> GeneVocabulary:
+        return self.vocabulary_file.load()
+
+    def insert_validation(self, data: GeneDiffValidation):
+        out_path = os.path.join(self.validation_path, f"{data.source}.json")
+        self._write_json(out_path, data.to_dict(), Utils.SetEncoder)
+        self.index.insert_validation(data.source,
+                                     self._relative_path(out_path))
+
+    def delete_validation(self, source=None):
+        if source is None:
+            Utils.delete_files_from_folder(self.validation_path)
+        else:
+            out_path = os.path.join(self.validation_path, f"{source}.json")
+            if os.path.isfile(out_path):
+                os.unlink(out_path)
+        self.index.delete_validation(source)
+
+    def get_validation_data(self, source, tf) -> GeneDiffValidation:
+        out_path = os.path.join(self.validation_path, f"{source}.json")
+        data = self._load_json(out_path)
+        if data is None:
+            return None
+        return GeneDiffValidation(data)
+
+    def get_validation_sources(self):
+        return self.index.get_validation_sources()
+
+    def insert_geo(self, data: GeoData):
+        self.index.insert_geo(*self._write_geo(data))
+
+    def insert_many_geo(self, datas):
+        entries = [self._write_geo(data) for data in datas]
+        self.index.insert_many_geo(entries)
+
+    def delete_geo(self):
+        for folder in Utils.list_folders_in_folder(self.geo_path):
+            Utils.delete_files_from_folder(os.path.join(self.geo_path,
+                                                        folder))
+        self.index.delete_geo()
+
+    def iter_geo(self, filter, meta_only=False):
+        for path, meta_data in self.index.find_geo(filter):
+            if meta_only:
+                yield GeoData.from_meta_data(meta_data)
+                continue
+            data = self._load_geo(self._absolute_path(path), meta_data)
+            if data is not None:
+                yield data
+
+    def get_geo(self, filter) -> List[GeoData]:
+        return list(self.iter_geo(filter))
+
+    def insert_method_results(self,
+                              result: GeneMethodResult,
+                              method_name: str,
+                              experiment_name: str):
+        method_folder = os.path.join(self.results_path, method_name)
+        Utils.create_folder_if_not_exist(method_folder)
+        file_output = os.path.join(method_folder, f"{experiment_name}.json")
+        raw_data = self._write_json(file_output, result.to_dict())
+        self.index.insert_results(method_name,
+                                  experiment_name,
+                                  self._relative_path(file_output),
+                                  StorageIndex.checksum(raw_data),
+                                  result_key=result.result_key)
+
+    def insert_many_method_results(self, entries):
+        # entries are (result, method_name, experiment_name), all of them
+        # are appended to the results pack in a single write
+        records = []
+        for result, method_name, experiment_name in entries:
+            records.append({'method_name': method_name,
+                            'experiment_name': experiment_name,
+                            'result': result.to_dict()})
+        if not records:
+            return
+        locations = self.results_pack.append(records)
+        self.index.insert_many_results(
+            self.__get_pack_index_entries(records, locations))
+
+    def get_method_results(self, filter):
+        ret_data = []
+        for path, offset, length in self.index.find_results(filter):
+            abs_path = self._absolute_path(path)
+            if offset is None:
+                data = self._load_json(abs_path)
+            else:
+                data = ResultsPack.read(abs_path, offset, length)['result']
+            if data is not None:
+                ret_data.append(GeneMethodResult(data))
+        return ret_data
+
+    def get_many_method_results(self, method_name, experiment_names):
+        rows = self.index.find_many_results(method_name, experiment_names)
+        ret_data = {}
+        pack_rows = {}
+        for experiment_name, path, offset, length in rows:
+            if offset is None:
+                data = self._load_json(self._absolute_path(path))
+                if data is not None:
+                    ret_data[experiment_name] = GeneMethodResult(data)
+            else:
+                pack_rows.setdefault(path, []).append(
+                    (experiment_name, offset, length))
+        for path, path_rows in pack_rows.items():
+            locations = [(offset, length) for _, offset, length in path_rows]
+            records = ResultsPack.read_many(self._absolute_path(path),
+                                            locations)
+            for row, record in zip(path_rows, records):
+                ret_data[row[0]] = GeneMethodResult(record['result'])
+        return ret_data
+
+    def has_method_results(self, method_name: str,
+                           experiment_name: str,
+                           result_key=None):
+        return self.index.has_results(method_name, experiment_name,
+                                      result_key)
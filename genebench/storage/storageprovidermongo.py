@@ -1,9 +1,13 @@
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 import gridfs
 import copy
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from genebench.storage.storageprovider import StorageProvider
 from genebench.datatypes import GeoData, GeneMethodResult, GeneDiffValidation
+from genebench.datatypes import GeneVocabulary
 from typing import List
 from genebench.utils import Utils
 
@@ -18,7 +22,10 @@ class MongoConfig:
                  validation_collection_name,
                  geo_data_collection_name,
                  results_collection_name,
-                 anon):
+                 anon,
+                 max_workers=8,
+                 vocabulary_collection_name="vocabulary",
+                 max_pool_size=100):
         self.user = user
         self.password = password
         self.host = host
@@ -28,111 +35,299 @@ class MongoConfig:
         self.geo_data_collection_name = geo_data_collection_name
         self.results_collection_name = results_collection_name
         self.anon = anon
+        self.max_workers = max_workers
+        self.vocabulary_collection_name = vocabulary_collection_name
+        self.max_pool_size = max_pool_size
+
 
 class StorageProviderMongo(StorageProvider):
-    def __init__(self, config: dict):
+    # fields of a geo document, used as projection so the gridfs file id
+    # and anything else stored next to the meta data is not sent back
+    GEO_META_FIELDS = ['name', 'perturbed_series_names',
+                       'control_series_names', 'extra_info',
+                       'source', 'genes', 'pf']
+
+    def __init__(self, config: dict, client=None):
         self.config = MongoConfig(**config)
-        if self.config.anon:
+        # a client can be passed in (ex: mongomock), otherwise one pooled
+        # client is shared by all the gridfs fetch threads
+        if client is not None:
+            self.client = client
+        elif self.config.anon:
             self.client = MongoClient(host=self.config.host,
-                                      port=self.config.port)
+                                      port=self.config.port,
+                                      maxPoolSize=self.config.max_pool_size)
         else:
             self.client = MongoClient(host=self.config.host,
                                       port=self.config.port,
                                       username=self.config.user,
-                                      password=self.config.password)
+                                      password=self.config.password,
+                                      maxPoolSize=self.config.max_pool_size)
 
         self.database = self.client[self.config.database_name]
         self.filesystem = gridfs.GridFS(self.database)
+        self.executor = ThreadPoolExecutor(self.config.max_workers)
+        self.__create_indexes()
+
+    def __create_indexes(self):
+        # create_index is a no op when the index already exists
+        results = self.database[self.config.results_collection_name]
+        results.create_index([('method_name', 1), ('experiment_name', 1)])
+        results.create_index([('experiment_name', 1)])
+        geo = self.database[self.config.geo_data_collection_name]
+        geo.create_index([('source', 1), ('pf', 1)])
+        geo.create_index([('source', 1), ('name', 1)])
+        validation = self.database[self.config.validation_collection_name]
+        validation.create_index([('source', 1)])
+        # one document per gene, the gene id is the _id: a gene or an id
+        # can only be stored once
+        vocabulary = self.database[self.config.vocabulary_collection_name]
+        vocabulary.create_index([('name', 1)], unique=True)
 
-    def __delete(self, section_name):
-        self.database[section_name].delete_many({})
+    def __delete(self, section_name, filter=None):
+        self.database[section_name].delete_many(filter or {})
 
     def __insert(self, section_name, data):
         self.database[section_name].insert_one(data)
 
-    def __insert_big_data(self, section_name, meta_data, big_data):
+    def __put_big_data(self, meta_data, big_data):
         json_string = json.dumps(big_data, cls=Utils.SetEncoder)
         file_id = self.filesystem.put(json_string.encode('utf-8'))
         save_meta_data = copy.copy(meta_data)
         save_meta_data['file_id'] = file_id
-        self.__insert(section_name, save_meta_data)
-
-    def __get_big_data(self, section_name, filter):
-        all_data = list(self.__get_data(section_name, filter))
-        for data in all_data:
-            data_link = data['file_id']
-            raw_binary = self.filesystem.get(data_link)
-            utf8_data = raw_binary.read().decode("utf-8")
-            data['file'] = json.loads(utf8_data)
+        return save_meta_data
+
+    def __insert_big_data(self, section_name, meta_data, big_data):
+        self.__insert(section_name, self.__put_big_data(meta_data, big_data))
+
+    def __insert_many_big_data(self, section_name, entries):
+        # gridfs puts run concurrently, the meta data documents are then
+        # written with a single insert_many
+        if not entries:
+            return
+        documents = list(self.executor.map(
+            lambda entry: self.__put_big_data(*entry), entries))
+        self.database[section_name].insert_many(documents)
+
+    def __delete_big_data(self, section_name, filters):
+        # documents matching any of the filters and their gridfs files
+        if not filters:
+            return
+        old_data = list(self.__get_data(section_name, {'$or': filters},
+                                        {'file_id': 1}))
+        if not old_data:
+            return
+        for data in old_data:
+            self.filesystem.delete(data['file_id'])
+        ids = [data['_id'] for data in old_data]
+        self.database[section_name].delete_many({'_id': {'$in': ids}})
+
+    def __load_big_data(self, data):
+        raw_binary = self.filesystem.get(data['file_id'])
+        utf8_data = raw_binary.read().decode("utf-8")
+        return json.loads(utf8_data)
+
+    def __iter_big_data(self, documents):
+        # gridfs files are fetched and parsed by the thread pool, at most
+        # max_workers of them ahead of the consumer
+        pending = deque()
+        for data in documents:
+            pending.append((data, self.executor.submit(self.__load_big_data,
+                                                       data)))
+            if len(pending) >= self.config.max_workers:
+                data, future = pending.popleft()
+                yield data, future.result()
+        while pending:
+            data, future = pending.popleft()
+            yield data, future.result()
+
+    def __get_big_data(self, section_name, filter, projection=None):
+        all_data = []
+        documents = self.__get_data(section_name, filter, projection)
+        for data, big_data in self.__iter_big_data(documents):
+            data['file'] = big_data
+            all_data.append(data)
         return all_data
 
-    def __get_data(self, section_name, filter):
-        return self.database[section_name].find(filter)
+    def __get_data(self, section_name, filter, projection=None):
+        return self.database[section_name].find(filter, projection)
 
     def __get_data_distinct(self, section_name, filter, field):
-        return self.database[section_name].find(filter).distinct(field)
+        return self.database[section_name].distinct(field, filter)
+
+    def __has_data(self, section_name, filter):
+        count = self.database[section_name].count_documents(filter, limit=1)
+        return count > 0
+
+    def __get_vocabulary_names(self):
+        # stored gene names, ordered by id
+        section = self.database[self.config.vocabulary_collection_name]
+        documents = section.find({}, sort=[('_id', 1)])
+        return [document['name'] for document in documents]
+
+    def insert_vocabulary(self, vocabulary: GeneVocabulary):
+        # appends the genes missing from the database, when another process
+        # appended in the meantime its genes are merged first, the same id
+        # given to two genes raises a VocabularyConflict
+        section = self.database[self.config.vocabulary_collection_name]
+        while True:
+            names = self.__get_vocabulary_names()
+            vocabulary.merge(names)
+            documents = [{'_id': gene_id, 'name': vocabulary.names[gene_id]}
+                         for gene_id in range(len(names),
+                                              len(vocabulary.names))]
+            if not documents:
+                return
+            try:
+                section.insert_many(documents, ordered=True)
+                return
+            except BulkWriteError as error:
+                # only duplicates mean someone else appended first
+                codes = {write_error['code'] for write_error
+                         in error.details.get('writeErrors', [])}
+                if codes != {11000}:
+                    raise
+                vocabulary.merge(self.__get_vocabulary_names())
+
+    def get_vocabulary(self) -> GeneVocabulary:
+        names = self.__get_vocabulary_names()
+        if not names:
+            return None
+        return GeneVocabulary({'genes': names})
 
     def insert_validation(self, data: GeneDiffValidation):
         section = self.config.validation_collection_name
         self.__insert_big_data(section, {"source": data.source},
                                data.data)
 
-    def delete_validation(self):
+    def delete_validation(self, source=None):
         section = self.config.validation_collection_name
-        self.__delete(section)
+        self.__delete(section, None if source is None else {'source': source})
 
     def get_validation_data(self, source, tf) -> GeneDiffValidation:
         section = self.config.validation_collection_name
-        filter = {'tf': tf, 'source': source}
-        data = self.__get_data(section, filter)
+        data = self.database[section].find_one({'source': source},
+                                               {'_id': 0, 'file_id': 1})
+        if data is None:
+            return None
         ret_data = GeneDiffValidation()
-        ret_data.data = data['data']
-        ret_data.source = data['source']
+        ret_data.data = self.__load_big_data(data)
+        ret_data.source = source
         return ret_data
 
     def get_validation_sources(self):
         section = self.config.validation_collection_name
-        return self.__get_data_distinct(self, section, {}, "source")
+        return sorted(self.__get_data_distinct(section, {}, "source"))
 
     def delete_geo(self):
         section = self.config.geo_data_collection_name
         self.__delete(section)
 
+    def __delete_experiments(self, datas):
+        # an experiment is stored once per (source, name), inserting it
+        # again replaces the old document and its gridfs file
+        section = self.config.geo_data_collection_name
+        self.__delete_big_data(section, [{'source': data.source,
+                                          'name': data.name}
+                                         for data in datas])
+
     def insert_geo(self, data: GeoData):
         section = self.config.geo_data_collection_name
+        self.__delete_experiments([data])
         self.__insert_big_data(section,
                                data.get_meta_data(),
                                data.get_big_data())
 
-    def get_geo(self, filter) -> List[GeoData]:
+    def insert_many_geo(self, datas):
         section = self.config.geo_data_collection_name
-        return self.__get_big_data(self, section, filter)
+        datas = list(datas)
+        self.__delete_experiments(datas)
+        entries = [(data.get_meta_data(), data.get_big_data())
+                   for data in datas]
+        self.__insert_many_big_data(section, entries)
+
+    def iter_geo(self, filter, meta_only=False):
+        section = self.config.geo_data_collection_name
+        projection = {field: 1 for field in
+                      StorageProviderMongo.GEO_META_FIELDS}
+        projection['_id'] = 0
+        if meta_only:
+            for data in self.__get_data(section, filter, projection):
+                yield GeoData.from_meta_data(data)
+            return
+        projection['file_id'] = 1
+        documents = self.__get_data(section, filter, projection)
+        for data, big_data in self.__iter_big_data(documents):
+            data.update(big_data)
+            yield GeoData(data)
+
+    def get_geo(self, filter) -> List[GeoData]:
+        return list(self.iter_geo(filter))
+
+    def __get_results_meta_data(self, result, method_name, experiment_name):
+        return {'method_name': method_name,
+                'experiment_name': experiment_name,
+                'result_key': result.result_key}
+
+    def __delete_method_results(self, names):
+        # a (method, experiment) pair has a single result, recomputed
+        # results replace the old document and its gridfs file
+        section = self.config.results_collection_name
+        self.__delete_big_data(section, [{'method_name': method_name,
+                                          'experiment_name': experiment_name}
+                                         for method_name, experiment_name
+                                         in names])
 
     def insert_method_results(self,
                               result: GeneMethodResult,
                               method_name: str,
                               experiment_name: str):
         section = self.config.results_collection_name
-        meta_data = {
-                    'method_name': method_name,
-                    'experiment_name': experiment_name}
+        self.__delete_method_results([(method_name, experiment_name)])
+        meta_data = self.__get_results_meta_data(result,
+                                                 method_name,
+                                                 experiment_name)
         self.__insert_big_data(section,
                                meta_data,
                                result.to_dict())
 
+    def insert_many_method_results(self, entries):
+        section = self.config.results_collection_name
+        if not entries:
+            return
+        self.__delete_method_results([(method_name, experiment_name)
+                                      for _, method_name, experiment_name
+                                      in entries])
+        big_data_entries = []
+        for result, method_name, experiment_name in entries:
+            meta_data = self.__get_results_meta_data(result,
+                                                     method_name,
+                                                     experiment_name)
+            big_data_entries.append((meta_data, result.to_dict()))
+        self.__insert_many_big_data(section, big_data_entries)
+
     def get_method_results(self,
                            filter):
         section = self.config.results_collection_name
-        data = self.__get_big_data(self, section, filter)['file']
-        return GeneMethodResult(data)
+        all_data = self.__get_big_data(section, filter,
+                                       {'_id': 0, 'file_id': 1})
+        return [GeneMethodResult(data['file']) for data in all_data]
+
+    def get_many_method_results(self, method_name, experiment_names):
+        section = self.config.results_collection_name
+        filter = {'method_name': method_name,
+                  'experiment_name': {'$in': list(experiment_names)}}
+        projection = {'_id': 0, 'experiment_name': 1, 'file_id': 1}
+        documents = self.__get_data(section, filter, projection)
+        return {data['experiment_name']: GeneMethodResult(big_data)
+                for data, big_data in self.__iter_big_data(documents)}
 
     def has_method_results(self, method_name: str,
-                           experiment_name: str):
+                           experiment_name: str,
+                           result_key=None):
         section = self.config.results_collection_name
         filter = {'method_name': method_name,
                   'experiment_name': experiment_name}
-        results = self.database[section].find(filter)
-        count = results.count()
-        if count > 0:
-            return True
-        return False
+        if result_key is not None:
+            filter['result_key'] = result_key
+        return self.__has_data(section, filter)
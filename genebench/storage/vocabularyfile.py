@@ -0,0 +1,45 @@
+import os
+import json
+from contextlib import contextmanager
+from genebench.datatypes import GeneVocabulary
+try:
+    import fcntl
+except ImportError:
+    # not available on windows, saves are then not locked
+    fcntl = None
+
+
+class VocabularyFile:
+    # json vocabulary of the file providers, saves are merged with what is
+    # on disk under a file lock, so processes sharing the folder only
+    # append genes and a conflicting id is reported instead of written
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def __lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self) -> GeneVocabulary:
+        if not os.path.isfile(self.path):
+            return None
+        with open(self.path, "r") as in_file:
+            return GeneVocabulary(json.load(in_file))
+
+    def save(self, vocabulary: GeneVocabulary):
+        with self.__lock():
+            stored = self.load()
+            if stored is not None and not vocabulary.merge(stored.names):
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as out:
+                json.dump(vocabulary.to_dict(), out)
+            os.replace(temp_path, self.path)
@@ -1,4 +1,5 @@
 import numpy as np
+import hashlib
 import logging
 import json
 import matplotlib.pyplot as plt
@@ -54,8 +55,18 @@ class Utils:
         def default(self, obj):
             if isinstance(obj, set):
                 return list(obj)
+            if isinstance(obj, np.ndarray):
+                return obj.tolist()
             return json.JSONEncoder.default(self, obj)
 
+    @staticmethod
+    def file_digest(path, chunk_size=1048576):
+        sha = hashlib.sha1()
+        with open(path, "rb") as in_file:
+            for chunk in iter(lambda: in_file.read(chunk_size), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
     @staticmethod
     def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
         return abs(a-b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
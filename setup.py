@@ -1,5 +1,8 @@
 import setuptools
 
 setuptools.setup(
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=["benchmarks",
+                                               "benchmarks.*",
+                                               "tests",
+                                               "tests.*"]),
     include_package_data=True)
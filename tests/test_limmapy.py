@@ -0,0 +1,68 @@
+import json
+import os
+import numpy as np
+from genebench.datatypes import GeneDiffInput
+from genebench.diffmethods.limmapy import LimmaPy
+
+# limma output (lmFit, eBayes, topTable and squeezeVar) for a 10 genes x
+# 3 + 3 samples matrix, the values recorded from R by the inmoose project
+# limma tests for the same data
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures',
+                       'limma_reference.json')
+
+
+def load_fixture():
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    data = np.array(fixture['data'])
+    num_control = fixture['num_control']
+    return fixture, data[:, :num_control], data[:, num_control:]
+
+
+def get_method():
+    method = LimmaPy()
+    method.setup({})
+    return method
+
+
+def test_moderated_t_matches_limma():
+    fixture, A, B = load_fixture()
+    expected = fixture['topTable']
+    method = get_method()
+    coef, stdev_unscaled, s2, df_residual = method._lm_fit(A, B)
+    t, df_total = method._e_bayes(coef, stdev_unscaled, s2, df_residual)
+    p_values = method._moderated_pvalues(A, B)
+    assert np.allclose(t, expected['t'], rtol=1e-6)
+    assert np.allclose(p_values, expected['P.Value'], rtol=1e-5)
+    assert np.allclose(method._bh_adjust(p_values), expected['adj.P.Val'],
+                       rtol=1e-5)
+
+
+def test_fit_f_dist_matches_squeeze_var():
+    fixture, A, B = load_fixture()
+    expected = fixture['squeezeVar']
+    s2_prior, df_prior = get_method()._fit_f_dist(np.array(expected['var']),
+                                                  expected['df'])
+    assert np.isclose(df_prior, expected['df.prior'], rtol=1e-6)
+    assert np.isclose(s2_prior, expected['var.prior'], rtol=1e-6)
+
+
+def test_missing_values_are_fitted_per_gene():
+    fixture, A, B = load_fixture()
+    data = np.concatenate((A, B), axis=1)
+    for gene, sample in fixture['missing']:
+        data[gene, sample] = np.nan
+    A, B = data[:, :A.shape[1]], data[:, A.shape[1]:]
+    expected = fixture['lmFit_missing']
+    method = get_method()
+    coef, stdev_unscaled, s2, df_residual = method._lm_fit(A, B)
+    assert np.array_equal(df_residual, expected['df.residual'])
+    assert np.allclose(np.sqrt(s2), expected['sigma'], rtol=1e-6)
+    assert np.allclose(coef, expected['coefficient'], rtol=1e-6)
+    # genes with missing values still get a moderated p value
+    genes = [f'g{index}' for index in range(len(data))]
+    input = GeneDiffInput()
+    input.control, input.perturbed, input.genes = A, B, genes
+    result = method.run(input)
+    assert len(result.scores) == len(genes)
+    assert np.all(np.isfinite(result.scores))
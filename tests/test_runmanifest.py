@@ -0,0 +1,20 @@
+from genebench.runmanifest import RunManifest
+
+
+def test_tasks_match_method_digest_and_result_key(tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    manifest = RunManifest(path)
+    manifest.mark_task_done('TTest', 'e1', 'm1', 'k1', 0.5)
+    manifest.mark_task_failed('TTest', 'e2', 'm1', 'k2',
+                              {'reason': 'timeout', 'message': '',
+                               'seconds': 1.0})
+    manifest.save()
+    # a reopened manifest resumes the same tasks
+    manifest = RunManifest(path)
+    assert manifest.is_task_done('TTest', 'e1', 'm1', 'k1')
+    assert manifest.is_task_failed('TTest', 'e2', 'm1', 'k2')
+    # a changed method or a reimported experiment runs again
+    assert not manifest.is_task_done('TTest', 'e1', 'm2', 'k1')
+    assert not manifest.is_task_done('TTest', 'e1', 'm1', 'k3')
+    assert not manifest.is_task_failed('TTest', 'e2', 'm1', 'k3')
+    assert not manifest.is_task_done('Random', 'e1', 'm1', 'k1')
@@ -0,0 +1,143 @@
+import itertools
+import math
+import numpy as np
+import scipy.stats
+from genebench.datatypes import GeneDiffInput
+from genebench.diffmethods.sampy import SAMPy
+
+# samr (3.0) two class unpaired functions written out gene by gene, the
+# reference the vectorized SAMPy is checked against
+
+
+def samr_wilcoxon_func(x, y):
+    n1 = np.sum(y == 1)
+    n2 = np.sum(y == 2)
+    r2 = np.array([scipy.stats.rankdata(row)[y == 2].sum() for row in x])
+    numer = r2 - (n2 / 2) * (n2 + 1) - (n1 * n2) / 2
+    sd = np.full(len(x), np.sqrt(n1 * n2 * (n1 + n2 + 1) / 12))
+    return numer, sd
+
+
+def samr_ttest_func(x, y):
+    n1 = np.sum(y == 1)
+    n2 = np.sum(y == 2)
+    numer = np.zeros(len(x))
+    sd = np.zeros(len(x))
+    for gene, row in enumerate(x):
+        a, b = row[y == 1], row[y == 2]
+        numer[gene] = b.mean() - a.mean()
+        sd[gene] = np.sqrt(((n2 - 1) * b.var(ddof=1) +
+                            (n1 - 1) * a.var(ddof=1)) *
+                           (1 / n1 + 1 / n2) / (n1 + n2 - 2))
+    return numer, sd
+
+
+def samr_mad(x):
+    x = x[~np.isnan(x)]
+    return 1.4826 * np.median(np.abs(x - np.median(x)))
+
+
+def samr_est_s0(tt, sd):
+    s0_perc = np.arange(0, 1.0001, 0.05)
+    br = np.unique(np.quantile(sd, np.linspace(0, 1, 101)))
+    nbr = len(br)
+    # cut(sd, br, labels=F), the smallest sd is not in any bin and goes
+    # to the first one
+    a = np.zeros(len(sd), dtype=int)
+    for gene, value in enumerate(sd):
+        for i in range(nbr - 1):
+            if br[i] < value <= br[i + 1]:
+                a[gene] = i + 1
+        if a[gene] == 0:
+            a[gene] = 1
+    cv_sd = np.zeros(len(s0_perc))
+    for j, perc in enumerate(s0_perc):
+        w = np.quantile(sd, perc) if j > 0 else 0
+        tt2 = tt * sd / (sd + w)
+        tt2[tt2 == np.inf] = np.nan
+        sds = np.array([samr_mad(tt2[a == i]) for i in range(1, nbr)])
+        cv_sd[j] = np.sqrt(np.var(sds, ddof=1)) / np.mean(sds)
+    o = np.flatnonzero(cv_sd == np.min(cv_sd))[0]
+    return np.quantile(sd[sd != 0], s0_perc[o])
+
+
+def samr_evo(x, y, func, s0):
+    # mean of the sorted d scores of every labeling (all of them, samr
+    # enumerates the labelings when there are at most nperms)
+    n = len(y)
+    n2 = np.sum(y == 2)
+    sorted_scores = []
+    for chosen in itertools.combinations(range(n), n2):
+        permuted = np.ones(n, dtype=int)
+        permuted[list(chosen)] = 2
+        numer, sd = func(x, permuted)
+        sorted_scores.append(np.sort(numer / (sd + s0)))
+    return np.mean(sorted_scores, axis=0)
+
+
+def get_data(num_control, num_perturbed, seed):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(300, num_control + num_perturbed))
+    x *= rng.gamma(2.0, 0.5, size=(300, 1))
+    x[:30, num_control:] += rng.normal(2.0, 1.0, size=(30, 1))
+    y = np.array([1] * num_control + [2] * num_perturbed)
+    return x, y
+
+
+def get_method(test_statistic):
+    method = SAMPy()
+    method.setup({'test_statistic': test_statistic, 'nperms': 100})
+    return method
+
+
+def get_statistic(method, x, y):
+    X = method._get_matrix(x[:, y == 1], x[:, y == 2])
+    numer, sd = method._statistic(X, (y == 2)[:, None])
+    return X, numer[:, 0], sd[:, 0]
+
+
+def test_standard_d_and_s0_match_samr():
+    for num_control, num_perturbed, seed in [(3, 3, 0), (4, 5, 1),
+                                             (6, 3, 2)]:
+        x, y = get_data(num_control, num_perturbed, seed)
+        method = get_method('standard')
+        X, numer, sd = get_statistic(method, x, y)
+        expected_numer, expected_sd = samr_ttest_func(x, y)
+        assert np.allclose(numer, expected_numer, rtol=1e-10)
+        assert np.allclose(sd, expected_sd, rtol=1e-10)
+        s0 = method._get_s0(numer, sd)
+        expected_s0 = samr_est_s0(expected_numer / expected_sd, expected_sd)
+        assert np.isclose(s0, expected_s0, rtol=1e-10)
+        if math.comb(len(y), num_perturbed) <= 100:
+            expected = samr_evo(x, y, samr_ttest_func, expected_s0)
+            assert np.allclose(method._expected_scores(X, num_control, s0),
+                               expected, rtol=1e-10)
+
+
+def test_wilcoxon_d_and_s0_match_samr():
+    x, y = get_data(4, 4, 3)
+    method = get_method('wilcoxon')
+    X, numer, sd = get_statistic(method, x, y)
+    expected_numer, expected_sd = samr_wilcoxon_func(x, y)
+    assert np.allclose(numer, expected_numer)
+    assert np.allclose(sd, expected_sd)
+    s0 = method._get_s0(numer, sd)
+    assert np.isclose(s0, np.quantile(expected_sd, 0.05))
+    expected = samr_evo(x, y, samr_wilcoxon_func, s0)
+    assert np.allclose(method._expected_scores(X, 4, s0), expected)
+
+
+def test_seeded_permutations_are_reproducible():
+    x, y = get_data(6, 6, 4)
+    results = []
+    for workers in [1, 3]:
+        method = SAMPy()
+        method.setup({'test_statistic': 'standard', 'delta': 0.5,
+                      'nperms': 50, 'seed': 7, 'perm_batch_size': 8,
+                      'workers': workers})
+        input = GeneDiffInput()
+        input.control, input.perturbed = x[:, y == 1], x[:, y == 2]
+        input.genes = [f'g{index}' for index in range(len(x))]
+        results.append(method.run(input))
+    assert np.array_equal(results[0].genes, results[1].genes)
+    assert np.array_equal(results[0].scores, results[1].scores)
@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+from genebench.datatypes import GeoData, GeneDiffValidation, GeneMethodResult
+from genebench.datatypes import GeneVocabulary
+from genebench.storage.storageproviderbinary import StorageProviderBinary
+from genebench.storage.storageproviderfilesystem import \
+    StorageProviderFileSystem
+from genebench.storage.storageprovidermongo import StorageProviderMongo
+
+
+def get_geo(name, num_genes=5):
+    return GeoData({
+        'name': name,
+        'source': 'silico',
+        'pf': 'G1',
+        'genes': [f'g{index}' for index in range(num_genes)],
+        'control_series_names': ['c1', 'c2'],
+        'perturbed_series_names': ['p1', 'p2', 'p3'],
+        'extra_info': {},
+        'control_array': np.arange(num_genes * 2.0).reshape(-1, 2).tolist(),
+        'perturbed_array': np.ones((num_genes, 3)).tolist()})
+
+
+def get_result(result_key):
+    result = GeneMethodResult.from_separate_lists(['g1', 'g0'], [0.9, 0.1])
+    result.result_key = result_key
+    return result
+
+
+def fill(provider):
+    provider.insert_geo(get_geo('e1'))
+    provider.insert_many_geo([get_geo('e2'), get_geo('e3')])
+    for source, genes in [('silico', ['g1']), ('other', ['g2'])]:
+        provider.insert_validation(GeneDiffValidation({
+            'source': source, 'data': {'G1': genes}}))
+    provider.insert_method_results(get_result('k1'), 'TTest', 'e1')
+    provider.insert_many_method_results([(get_result('k1'), 'TTest', 'e2'),
+                                         (get_result('k1'), 'Random', 'e1')])
+    provider.insert_vocabulary(GeneVocabulary({'genes': ['g0', 'g1']}))
+
+
+def check(provider):
+    experiments = provider.get_geo({'source': 'silico'})
+    assert sorted(data.name for data in experiments) == ['e1', 'e2', 'e3']
+    assert np.shape(experiments[0].control_array) == (5, 2)
+    assert np.shape(experiments[0].perturbed_array) == (5, 3)
+    meta = list(provider.iter_geo({'name': 'e2'}, meta_only=True))
+    assert [data.name for data in meta] == ['e2']
+    assert provider.get_validation_sources() == ['other', 'silico']
+    assert provider.get_validation_data('silico', None).data == {'G1': ['g1']}
+    results = provider.get_method_results({'method_name': 'TTest'})
+    assert len(results) == 2
+    assert list(results[0].genes) == ['g1', 'g0']
+    many = provider.get_many_method_results('TTest', ['e1', 'e2', 'e3'])
+    assert set(many) == {'e1', 'e2'}
+    assert provider.has_method_results('Random', 'e1', 'k1')
+    assert not provider.has_method_results('Random', 'e1', 'k2')
+    assert not provider.has_method_results('Random', 'e2')
+    assert provider.get_vocabulary().names == ['g0', 'g1']
+
+
+@pytest.fixture(params=['binary', 'filesystem', 'mongo'])
+def make_provider(request, tmp_path):
+    # every call opens a provider on the same data
+    if request.param == 'mongo':
+        mongomock = pytest.importorskip('mongomock')
+        import mongomock.gridfs
+        mongomock.gridfs.enable_gridfs_integration()
+        client = mongomock.MongoClient()
+        config = {'user': '', 'password': '', 'host': 'localhost',
+                  'port': 27017, 'database_name': 'genebench_test',
+                  'validation_collection_name': 'validation',
+                  'geo_data_collection_name': 'geo',
+                  'results_collection_name': 'results',
+                  'anon': True, 'max_workers': 2}
+        return lambda: StorageProviderMongo(config, client=client)
+    provider_class = {'binary': StorageProviderBinary,
+                      'filesystem': StorageProviderFileSystem}[request.param]
+    config = {'base_path': str(tmp_path),
+              'validation_folder': 'validation',
+              'geo_folder': 'geo',
+              'results_folder': 'results'}
+    return lambda: provider_class(config)
+
+
+def test_providers_round_trip(make_provider):
+    provider = make_provider()
+    fill(provider)
+    check(provider)
+    # a new provider on the same data and a rebuilt index see the same
+    reopened = make_provider()
+    check(reopened)
+    reopened.reindex()
+    check(reopened)
+
+
+def test_providers_replace_experiments_and_results(make_provider):
+    provider = make_provider()
+    fill(provider)
+    replaced = get_geo('e1')
+    replaced.control_array = np.asarray(replaced.control_array) + 100
+    provider.insert_geo(replaced)
+    provider.insert_many_geo([get_geo('e2')])
+    for name, offset in [('e1', 100), ('e2', 0)]:
+        experiments = provider.get_geo({'source': 'silico', 'name': name})
+        assert len(experiments) == 1
+        assert np.array_equal(experiments[0].control_array,
+                              np.asarray(get_geo(name).control_array) +
+                              offset)
+    assert len(provider.get_geo({'source': 'silico'})) == 3
+    provider.insert_many_method_results([(get_result('k2'), 'TTest', 'e1')])
+    results = provider.get_method_results({'method_name': 'TTest',
+                                           'experiment_name': 'e1'})
+    assert [result.result_key for result in results] == ['k2']
+    assert provider.has_method_results('TTest', 'e1', 'k2')
+    assert not provider.has_method_results('TTest', 'e1', 'k1')
+
+
+def test_providers_delete_validation(make_provider):
+    provider = make_provider()
+    fill(provider)
+    provider.delete_validation('other')
+    assert provider.get_validation_sources() == ['silico']
+    assert provider.get_validation_data('other', None) is None
+    provider.delete_validation()
+    assert provider.get_validation_sources() == []
+
+
+def test_binary_overwrite_keeps_memory_maps_valid(tmp_path):
+    config = {'base_path': str(tmp_path),
+              'validation_folder': 'validation',
+              'geo_folder': 'geo',
+              'results_folder': 'results',
+              'memory_map': True}
+    provider = StorageProviderBinary(config)
+    provider.insert_geo(get_geo('e1'))
+    mapped = provider.get_geo({'name': 'e1'})[0]
+    old_values = np.array(mapped.control_array)
+    replaced = get_geo('e1')
+    replaced.control_array = np.asarray(replaced.control_array) + 100
+    provider.insert_geo(replaced)
+    # the reader keeps the old file, a new read sees the new values
+    assert np.array_equal(mapped.control_array, old_values)
+    reloaded = provider.get_geo({'name': 'e1'})[0]
+    assert np.array_equal(reloaded.control_array, old_values + 100)
+    assert not [path for path in (tmp_path / 'geo' / 'silico').iterdir()
+                if path.suffix == '.tmp']
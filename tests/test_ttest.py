@@ -0,0 +1,25 @@
+import warnings
+import numpy as np
+import scipy.stats
+from genebench.diffmethods.ttest import TTest
+
+
+def test_welch_pvalues_match_scipy():
+    # random genes plus the edge cases: constant in both groups with
+    # different means (p 0), with equal means (nan), one constant group
+    # and a missing value
+    rng = np.random.default_rng(0)
+    for num_a, num_b in [(3, 3), (2, 5), (6, 4)]:
+        A = rng.normal(size=(200, num_a))
+        B = rng.normal(size=(200, num_b))
+        A[0], B[0] = 0.0, 5.0
+        A[1], B[1] = 2.0, 2.0
+        A[2] = 1.0
+        A[3, 0] = np.nan
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected = scipy.stats.ttest_ind(A, B, axis=1,
+                                             equal_var=False).pvalue
+        pvalues = TTest._welch_pvalues(A, B)
+        assert np.allclose(pvalues, expected, rtol=1e-10, equal_nan=True)
+        assert pvalues[0] == 0.0